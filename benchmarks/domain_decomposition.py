@@ -0,0 +1,71 @@
+"""
+Strong scaling of the domain-decomposition solver (`sorbet.domain_decomposition.SchwarzSolver`)
+
+A structured unit cube under tension along x is solved with a fixed number of subdomains (the largest worker count by
+default) on a growing number of worker processes. For every run, setup (partitioning, assembly, and factorization
+of the subdomains) and solve are timed, and speedup, parallel efficiency, and the load imbalance of the workers are
+reported and written as JSON. Runs headless without Gmsh.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+
+import sorbet
+
+
+def main() -> int:
+    cpu_count = os.cpu_count() or 1
+    default_workers = [2**k for k in range(cpu_count.bit_length()) if 2**k <= cpu_count]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-elements", type=int, default=20, help="elements per edge of the cube")
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers, help="numbers of worker processes")
+    parser.add_argument("--subdomains", type=int, help="number of subdomains (default: largest number of workers)")
+    parser.add_argument("--overlap", type=int, default=1, help="layers of overlapping elements")
+    parser.add_argument("--no-coarse-space", action="store_true", help="one-level additive Schwarz")
+    parser.add_argument("--output", help="JSON file for the results (default: output/benchmark_domain_decomposition.json)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    n = args.num_elements
+    nodes, elements = sorbet.mesh.create_structured_box(1.0, 1.0, 1.0, n, n, n)
+    mesh_index = sorbet.topology.MeshIndex(nodes, elements)
+    bcs = [
+        (mesh_index.nodes_on_plane(0, mesh_index.lower[0]), 0, 0.0),
+        (mesh_index.nodes_on_plane(0, mesh_index.upper[0]), 0, 0.01),
+        (mesh_index.nodes_on_plane(1, mesh_index.lower[1]), 1, 0.0),
+        (mesh_index.nodes_on_plane(2, mesh_index.lower[2]), 2, 0.0),
+    ]
+    prescribed_dofs, prescribed_values = sorbet.boundary_conditions.collect_prescribed_dofs(bcs)
+    print(f"{elements.shape[0]} elements, {nodes.size} DOFs, {args.subdomains or max(args.workers)} subdomains, {os.cpu_count()} CPUs")
+
+    results = sorbet.domain_decomposition.strong_scaling(
+        nodes,
+        elements,
+        {"E": 2.1e5, "nu": 0.3},
+        prescribed_dofs,
+        prescribed_values,
+        args.workers,
+        num_subdomains=args.subdomains,
+        overlap=args.overlap,
+        coarse_space=not args.no_coarse_space,
+    )
+    for result in results:
+        print(
+            f"{result['num_workers']:>3} workers: setup {result['setup_time']:.3f} s, solve {result['solve_time']:.3f} s "
+            f"({result['iterations']} iterations), speedup {result['speedup']:.2f}, efficiency {100.0 * result['efficiency']:.0f} %, "
+            f"imbalance setup {result['setup_imbalance']:.2f} / solves {result['apply_imbalance']:.2f}"
+        )
+
+    output = Path(args.output) if args.output else sorbet.paths.setup() / Path("benchmark_domain_decomposition.json")
+    with open(output, "w") as file:
+        json.dump({"num_elements": int(elements.shape[0]), "num_dof": int(nodes.size), "cpu_count": os.cpu_count(), "runs": results}, file, indent=4)
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+"""
+Benchmark the startup cost of `import sorbet` and the modules needed by headless assemble/solve runs
+
+Each measurement runs in a fresh interpreter. The benchmark fails (exit code 1) if the median time exceeds
+`--max-seconds` or if any heavy plotting/meshing dependency gets imported along the way.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["gmsh", "pyvista", "vtk", "matplotlib"]
+
+MEASUREMENT = f"""
+import json, sys, time
+start = time.perf_counter()
+import sorbet
+sorbet.fem, sorbet.boundary_conditions, sorbet.solvers, sorbet.mesh, sorbet.post_processing, sorbet.sparsity
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy_modules": [name for name in {HEAVY_MODULES!r} if name in sys.modules]}}))
+"""
+
+
+def measure(num_runs: int) -> tuple[list[float], set[str]]:
+    times = []
+    heavy_modules = set()
+    for _ in range(num_runs):
+        output = subprocess.run([sys.executable, "-c", MEASUREMENT], check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.splitlines()[-1])
+        times.append(result["seconds"])
+        heavy_modules.update(result["heavy_modules"])
+    return times, heavy_modules
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="number of fresh interpreters to measure")
+    parser.add_argument("--max-seconds", type=float, default=1.0, help="allowed median import time")
+    args = parser.parse_args()
+
+    times, heavy_modules = measure(args.runs)
+    median = statistics.median(times)
+    print(f"import time: median = {median:.3f} s, min = {min(times):.3f} s, max = {max(times):.3f} s ({args.runs} runs)")
+
+    failed = False
+    if heavy_modules:
+        print(f"REGRESSION: heavy modules imported eagerly: {sorted(heavy_modules)}")
+        failed = True
+    if median > args.max_seconds:
+        print(f"REGRESSION: median import time above {args.max_seconds:.3f} s")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Benchmark the pipeline mesh -> assembly -> solve -> post-processing across mesh sizes
+
+Every case is a cube meshed with `sorbet.mesh.create_cube(num_elements_thickness, mesh_size_plane)` (bypassing the
+mesh cache, so that the mesh stage always runs Gmsh) or, with `--mesh synthetic` or if Gmsh is not available, an
+equivalent structured mesh from `sorbet.mesh.create_structured_box`. Each stage is timed separately with the profiler
+of `sorbet.log` and memory tracing off, since tracemalloc slows down allocation-heavy stages; the peak of traced memory
+per stage is measured in a separate run. Results are written as JSON. With `--compare`, stage times are compared to a saved baseline and
+the benchmark fails (exit code 1) if any stage got slower by more than `--threshold`. Runs headless.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import scipy
+
+import sorbet
+
+STAGES = {
+    "mesh": "elements",
+    "assemble": "elements",
+    "solve": "dofs",
+    "post": "elements",
+}
+
+
+def create_mesh(num_elements_thickness: int, mesh_size_plane: float, mesh: str) -> tuple[np.ndarray, np.ndarray, str]:
+    if mesh != "synthetic":
+        try:
+            nodes, elements = sorbet.mesh.create_cube(mesh_size_plane=mesh_size_plane, num_elements_thickness=num_elements_thickness, use_cache=False)
+            return np.asarray(nodes), np.asarray(elements), "gmsh"
+        except (ImportError, OSError) as error:
+            if mesh == "gmsh":
+                raise
+            logging.warning(f"Gmsh not available ({error}), using a synthetic mesh")
+    num_elements_plane = round(1.0 / mesh_size_plane)
+    nodes, elements = sorbet.mesh.create_structured_box(1.0, 1.0, 1.0, num_elements_plane, num_elements_plane, num_elements_thickness)
+    return nodes, elements, "synthetic"
+
+
+def run_pipeline(num_elements_thickness: int, mesh_size_plane: float, mesh: str, solver: str, trace_memory: bool = False) -> dict:
+    """Run all stages once, returns the profile of every stage (with traced memory if `trace_memory`) and the mesh size"""
+
+    material_parameters = {"E": 2.1e5, "nu": 0.3}
+    sorbet.solvers.factorization_cache_clear()
+    sorbet.log.enable_profiling(trace_memory=trace_memory)
+
+    with sorbet.log.span("mesh"):
+        nodes, elements, mesh_source = create_mesh(num_elements_thickness, mesh_size_plane, mesh)
+
+    with sorbet.log.span("assemble"):
+        K = sorbet.fem.assemble_global_stiffness_matrix(nodes, elements, material_parameters)
+
+    with sorbet.log.span("solve"):
+        mesh_index = sorbet.topology.MeshIndex(nodes, elements)
+        bcs = [
+            (mesh_index.nodes_on_plane(0, mesh_index.lower[0]), 0, 0.0),
+            (mesh_index.nodes_on_plane(0, mesh_index.upper[0]), 0, 0.01),
+            (mesh_index.nodes_on_plane(1, mesh_index.lower[1]), 1, 0.0),
+            (mesh_index.nodes_on_plane(2, mesh_index.lower[2]), 2, 0.0),
+        ]
+        prescribed_dofs, prescribed_values = sorbet.boundary_conditions.collect_prescribed_dofs(bcs)
+        f = np.zeros(K.shape[0])
+        if solver == "direct":
+            u = sorbet.solvers.FactorizedSolver(K, prescribed_dofs).solve(f, prescribed_values)
+        else:
+            system = sorbet.boundary_conditions.apply_dirichlet_conditions(K, f, prescribed_dofs, prescribed_values)
+            u_free, _ = sorbet.solvers.conjugate_gradient(system.K, system.f, preconditioner=solver, dofs=system.free_dofs, nodes=nodes, log_every=0)
+            u = system.expand(u_free)
+
+    with sorbet.log.span("post"):
+        displacement = u.reshape(-1, 3)
+        fields = sorbet.post_processing.recover_stresses(nodes, elements, displacement, material_parameters)
+        with sorbet.results.ResultWriter(nodes, elements, "benchmark_pipeline_results") as writer:
+            writer.write_step(1.0, point_data={"displacement": displacement, **fields})
+
+    # the Voigt fields have to survive the reordering into the Tensor6 layout of the result file (not timed)
+    reader = sorbet.results.ResultReader("benchmark_pipeline_results")
+    for name in ("strain", "stress"):
+        if not np.array_equal(reader.read_field(name), fields[name]):
+            raise RuntimeError(f"Field {name} changed in the round trip through the result file")
+
+    profile = sorbet.log.report()
+    sorbet.log.disable_profiling()
+    stages = {section["name"]: section for section in profile["children"]}
+    return {
+        "mesh_source": mesh_source,
+        "num_elements": int(elements.shape[0]),
+        "num_dof": int(K.shape[0]),
+        "stages": stages,
+        "counters": sorbet.log.total_counters(profile),
+    }
+
+
+def benchmark_case(num_elements_thickness: int, mesh_size_plane: float, mesh: str, solver: str, repeats: int) -> dict:
+    """Fastest of `repeats` runs per stage, with throughput in elements/s or DOFs/s, and the peak memory from one more traced run"""
+
+    runs = [run_pipeline(num_elements_thickness, mesh_size_plane, mesh, solver) for _ in range(repeats)]
+    memory_run = run_pipeline(num_elements_thickness, mesh_size_plane, mesh, solver, trace_memory=True)
+    sizes = {"elements": runs[0]["num_elements"], "dofs": runs[0]["num_dof"]}
+    stages = {}
+    for stage, unit in STAGES.items():
+        seconds = min(run["stages"][stage]["wall_time"] for run in runs)
+        stages[stage] = {
+            "seconds": seconds,
+            "cpu_seconds": min(run["stages"][stage]["cpu_time"] for run in runs),
+            "throughput": sizes[unit] / seconds,
+            "throughput_unit": f"{unit}/s",
+            "peak_traced_bytes": memory_run["stages"][stage]["peak_traced_bytes"],
+        }
+    return {
+        "num_elements_thickness": num_elements_thickness,
+        "mesh_size_plane": mesh_size_plane,
+        "mesh_source": runs[0]["mesh_source"],
+        "solver": solver,
+        "num_elements": sizes["elements"],
+        "num_dof": sizes["dofs"],
+        "stages": stages,
+        "counters": runs[0]["counters"],
+    }
+
+
+def case_key(case: dict) -> tuple:
+    return (case["num_elements_thickness"], case["mesh_size_plane"], case["mesh_source"], case["solver"])
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_seconds: float) -> list[str]:
+    """Regressions of stage times compared to the baseline, as messages (slowdowns below `min_seconds` are treated as noise)"""
+
+    baseline_cases = {case_key(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        baseline_case = baseline_cases.get(case_key(case))
+        if baseline_case is None:
+            print(f"{case['num_elements']:>9} elements: no baseline")
+            continue
+        ratios = {stage: case["stages"][stage]["seconds"] / baseline_case["stages"][stage]["seconds"] for stage in STAGES}
+        print(f"{case['num_elements']:>9} elements: " + ", ".join(f"{stage} {ratio:.2f}x" for stage, ratio in ratios.items()))
+        for stage, ratio in ratios.items():
+            slowdown = case["stages"][stage]["seconds"] - baseline_case["stages"][stage]["seconds"]
+            if ratio > 1.0 + threshold and slowdown > min_seconds:
+                regressions.append(f"{stage} with {case['num_elements']} elements: {ratio:.2f}x slower than baseline")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=["3:0.2", "5:0.1", "10:0.05", "15:0.04"], help="cases as num_elements_thickness:mesh_size_plane")
+    parser.add_argument("--mesh", choices=["auto", "gmsh", "synthetic"], default="auto", help="mesh source (auto: Gmsh if available, synthetic otherwise; the mesh cache is bypassed)")
+    parser.add_argument("--solver", default="direct", help="direct, or a preconditioner name for CG (e.g. amg)")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per case (the fastest is reported per stage)")
+    parser.add_argument("--output", help="JSON file for the results (default: output/benchmark_pipeline.json)")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative slowdown per stage in compare mode")
+    parser.add_argument("--min-seconds", type=float, default=0.01, help="allowed absolute slowdown per stage in compare mode")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    cases = []
+    for size in args.sizes:
+        num_elements_thickness, mesh_size_plane = size.split(":")
+        case = benchmark_case(int(num_elements_thickness), float(mesh_size_plane), args.mesh, args.solver, args.repeats)
+        cases.append(case)
+        print(
+            f"{case['num_elements']:>9} elements, {case['num_dof']:>9} DOFs ({case['mesh_source']}): "
+            + ", ".join(
+                f"{stage} {result['seconds']:.3f} s ({result['throughput']:.3g} {result['throughput_unit']}, {result['peak_traced_bytes'] / 2**20:.0f} MiB)"
+                for stage, result in case["stages"].items()
+            )
+        )
+
+    results = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "scipy": scipy.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "cases": cases,
+    }
+    output = Path(args.output) if args.output else sorbet.paths.setup() / Path("benchmark_pipeline.json")
+    with open(output, "w") as file:
+        json.dump(results, file, indent=4)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
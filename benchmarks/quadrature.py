@@ -0,0 +1,83 @@
+"""
+Compare the integration schemes of the hexahedral element in accuracy and time
+
+Accuracy: tip deflection of a cantilever (clamped at x = 0, shear force at the free end) on successively refined
+structured meshes, compared to Timoshenko beam theory. Time: computation of the element stiffness matrices of
+`--num-elements` elements (distorted, so that no congruent elements are reused). Runs headless without Gmsh.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+import sorbet
+
+SCHEMES = {
+    "8-point": {"num_points": 8},
+    "4-point": {"num_points": 4},
+    "1-point + hourglass": {"num_points": 1, "hourglass_stiffness": 0.1},
+}
+
+
+def cantilever_tip_deflection(num_elements_length: int, material_parameters: dict, quadrature: dict, length: float = 10.0) -> float:
+    num_elements_section = max(num_elements_length // 10, 1)
+    nodes, elements = sorbet.mesh.create_structured_box(length, 1.0, 1.0, num_elements_length, num_elements_section, num_elements_section)
+    clamped = np.flatnonzero(np.isclose(nodes[:, 0], 0.0))
+    tip = np.flatnonzero(np.isclose(nodes[:, 0], length))
+
+    f = np.zeros(nodes.size)
+    f[3 * tip + 2] = 1.0 / tip.shape[0]  # unit shear force, distributed to the tip nodes
+    prescribed_dofs, prescribed_values = sorbet.boundary_conditions.collect_prescribed_dofs([(clamped, dof, 0.0) for dof in range(3)])
+    solver = sorbet.solvers.FactorizedSolver.from_mesh(nodes, elements, material_parameters, prescribed_dofs, use_cache=False, **quadrature)
+    u = solver.solve(f, prescribed_values).reshape(-1, 3)
+    return u[tip, 2].mean()
+
+
+def timoshenko_tip_deflection(material_parameters: dict, length: float = 10.0) -> float:
+    E, nu = material_parameters["E"], material_parameters["nu"]
+    G = E / (2.0 * (1.0 + nu))
+    second_moment_of_area = 1.0 / 12.0
+    return length**3 / (3.0 * E * second_moment_of_area) + length / (5.0 / 6.0 * G)
+
+
+def time_element_matrices(num_elements: int, material_parameters: dict, quadrature: dict, num_runs: int) -> float:
+    n = round(num_elements ** (1.0 / 3.0))
+    nodes, elements = sorbet.mesh.create_structured_box(1.0, 1.0, 1.0, n, n, n)
+    nodes = nodes + 0.1 / n * np.random.default_rng(0).uniform(-1.0, 1.0, nodes.shape)
+    element_nodes = nodes[elements]
+    times = []
+    for _ in range(num_runs):
+        start = time.perf_counter()
+        sorbet.fem.element_stiffness_matrices(element_nodes, material_parameters, **quadrature)
+        times.append(time.perf_counter() - start)
+    return min(times) / elements.shape[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refinements", type=int, nargs="+", default=[10, 20, 40], help="numbers of elements along the cantilever")
+    parser.add_argument("--num-elements", type=int, default=100_000, help="number of elements for the timing")
+    parser.add_argument("--runs", type=int, default=3, help="number of timing runs (the fastest is reported)")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    material_parameters = {"E": 2.1e5, "nu": 0.3}
+    reference = timoshenko_tip_deflection(material_parameters)
+    results = {}
+    for name, quadrature in SCHEMES.items():
+        seconds_per_element = time_element_matrices(args.num_elements, material_parameters, quadrature, args.runs)
+        errors = {n: cantilever_tip_deflection(n, material_parameters, quadrature) / reference - 1.0 for n in args.refinements}
+        results[name] = {"seconds_per_element": seconds_per_element, "relative_tip_deflection_errors": errors}
+        print(f"{name:>20}: {1e6 * seconds_per_element:6.2f} us/element, tip deflection errors: " + ", ".join(f"{n}: {error:+.2%}" for n, error in errors.items()))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
+import logging
+
 import numpy as np
 
 import sorbet
@@ -5,42 +7,42 @@ import sorbet
 
 def main() -> None:
     nodes, elements = sorbet.mesh.create_cube(num_elements_thickness=7)
+    nodes, elements, renumbering = sorbet.renumbering.renumber_mesh(nodes, elements, method="rcm")
     material_parameters = {"E": 2.1e5, "nu": 0.3}
-    K = sorbet.fem.assemble_global_stiffness_matrix(nodes, elements, material_parameters)
 
     num_nodes = nodes.shape[0]
     f = np.zeros(3 * num_nodes)  # initialize force vector with zeros
 
     # Find nodes at relevant faces
-    face_x_min = np.where(np.isclose(nodes[:, 0], 0.0))[0]
-    face_x_max = np.where(np.isclose(nodes[:, 0], nodes[:, 0].max()))[0]
-    face_y_min = np.where(np.isclose(nodes[:, 1], 0.0))[0]
-    face_z_min = np.where(np.isclose(nodes[:, 2], 0.0))[0]
+    mesh_index = sorbet.topology.MeshIndex(nodes, elements)
+    face_x_min = mesh_index.nodes_on_plane(0, mesh_index.lower[0])
+    face_x_max = mesh_index.nodes_on_plane(0, mesh_index.upper[0])
+    face_y_min = mesh_index.nodes_on_plane(1, mesh_index.lower[1])
+    face_z_min = mesh_index.nodes_on_plane(2, mesh_index.lower[2])
 
     # Define displacement boundary conditions
-    bcs = []
-    for node in face_x_min:
-        bcs.extend([(node, 0, 0.0)])
-    for node in face_x_max:
-        bcs.append((node, 0, 0.5))
-    for node in face_y_min:
-        bcs.extend([(node, 1, 0.0)])
-    for node in face_z_min:
-        bcs.extend([(node, 2, 0.0)])
+    bcs = [
+        (face_x_min, 0, 0.0),
+        (face_x_max, 0, 0.5),
+        (face_y_min, 1, 0.0),
+        (face_z_min, 2, 0.0),
+    ]
 
     # Apply boundary conditions
-    for node, dof, value in bcs:
-        dof_index = 3 * node + dof
-        K[dof_index, :] = 0
-        K[dof_index, dof_index] = 1
-        f[dof_index] = value
-
-    # Solve the system
-    u = np.linalg.solve(K, f)
+    prescribed_dofs, prescribed_values = sorbet.boundary_conditions.collect_prescribed_dofs(bcs)
+
+    # Solve the system (further load cases with the same prescribed DOFs reuse the factorization)
+    solver = sorbet.solvers.FactorizedSolver.from_mesh(nodes, elements, material_parameters, prescribed_dofs)
+    u = solver.solve(f, prescribed_values)
     displacement = u.reshape(-1, 3)
+    center_displacement = mesh_index.probe(0.5 * (mesh_index.lower + mesh_index.upper), displacement)[0]
+    logging.info(f"Displacement at the center of the cube: {center_displacement}")
 
     # Run post-processing
-    sorbet.post_processing.save_nodal_values(displacement, "displacement")
+    sorbet.post_processing.save_nodal_values(displacement, "displacement", renumbering)
+    fields = sorbet.post_processing.recover_stresses(nodes, elements, displacement, material_parameters)
+    with sorbet.results.ResultWriter(nodes, elements) as writer:
+        writer.write_step(time=1.0, point_data={"displacement": displacement, **fields})
     num_elements = elements.shape[0]
     num_elements_per_node = elements[0, :].shape[0]
     sorbet.post_processing.plot_deformed_mesh(num_elements, num_elements_per_node, nodes, elements, displacement)
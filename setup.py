@@ -22,7 +22,12 @@ if __name__ == "__main__":
     /____/\____/_/  /_.___/\___/\__/
     """
     logging.info(sorbet_logo)
+    sorbet.log.enable_profiling()
     section = "main"
-    sorbet.log.start(section)
-    main()
-    sorbet.log.end(section)
+    try:
+        sorbet.log.start(section)
+        main()
+        sorbet.log.end(section)
+    finally:
+        sorbet.log.log_report()
+        sorbet.log.write_report(output_dir / Path("profile.json"))  # next to app.log
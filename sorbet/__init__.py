@@ -1 +1,37 @@
-from . import fem, log, mesh, paths, post_processing, sparsity
+"""
+Sorbet: a small, readable, and extensible finite element tool
+
+Submodules are imported lazily on first attribute access, e.g. `sorbet.fem`, so that `import sorbet`
+stays cheap and heavy dependencies (Gmsh, PyVista/VTK, Matplotlib) are only loaded when actually used.
+"""
+
+import importlib
+
+__all__ = [
+    "boundary_conditions",
+    "domain_decomposition",
+    "fem",
+    "log",
+    "matrix_free",
+    "mesh",
+    "mesh_cache",
+    "nonlinear",
+    "parallel",
+    "paths",
+    "post_processing",
+    "renumbering",
+    "results",
+    "solvers",
+    "sparsity",
+    "topology",
+]
+
+
+def __getattr__(name: str):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)  # also sets the attribute on the package
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,98 @@
+"""Dirichlet boundary conditions for the (sparse) global system of equations"""
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse
+
+
+class ConstrainedSystem:
+    """Global system of equations with applied Dirichlet boundary conditions"""
+
+    def __init__(
+        self,
+        K: scipy.sparse.csr_matrix,
+        f: npt.NDArray[np.float64],
+        num_dof: int,
+        free_dofs: npt.NDArray[np.int64],
+        prescribed_dofs: npt.NDArray[np.int64],
+        prescribed_values: npt.NDArray[np.float64],
+    ):
+        self.K = K
+        self.f = f
+        self.num_dof = num_dof
+        self.free_dofs = free_dofs
+        self.prescribed_dofs = prescribed_dofs
+        self.prescribed_values = prescribed_values
+
+    def expand(self, u: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """Map the solution of the constrained system back to all DOFs of the global system"""
+
+        u_full = np.zeros(self.num_dof)
+        u_full[self.free_dofs] = u[self.free_dofs] if u.shape[0] == self.num_dof else u
+        u_full[self.prescribed_dofs] = self.prescribed_values
+        return u_full
+
+
+def collect_prescribed_dofs(
+    node_sets: list[tuple[npt.NDArray[np.int64], int, float | npt.NDArray[np.float64]]],
+    num_dof_per_node: int = 3,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+    """
+    Convert node sets with prescribed values to global DOF indices and values
+
+    Each entry of `node_sets` is `(nodes, dof, value)`, where `dof` is the local DOF (0, 1, 2 for x, y, z)
+    and `value` is either a scalar or an array with one value per node.
+    If a DOF is prescribed more than once, the last value wins.
+    """
+
+    dofs = [num_dof_per_node * np.asarray(nodes, dtype=np.int64) + dof for nodes, dof, _ in node_sets]
+    values = [np.broadcast_to(np.asarray(value, dtype=np.float64), dof_indices.shape) for (_, _, value), dof_indices in zip(node_sets, dofs)]
+    dofs = np.concatenate(dofs)
+    values = np.concatenate(values)
+
+    # keep the last occurrence of every DOF
+    unique_dofs, index_reversed = np.unique(dofs[::-1], return_index=True)
+    return unique_dofs, values[::-1][index_reversed]
+
+
+def apply_dirichlet_conditions(
+    K: scipy.sparse.csr_matrix | npt.NDArray[np.float64],
+    f: npt.NDArray[np.float64],
+    prescribed_dofs: npt.NDArray[np.int64],
+    prescribed_values: npt.NDArray[np.float64],
+    method: str = "elimination",
+) -> ConstrainedSystem:
+    """
+    Apply Dirichlet boundary conditions in bulk while keeping the system symmetric
+
+    Options for method:
+    - "elimination": remove prescribed DOFs, i.e., solve the reduced system for the free DOFs only
+    - "lifting": keep all DOFs, move the known values to the right-hand side and replace the
+      prescribed rows and columns by the identity
+    """
+
+    K = scipy.sparse.csr_matrix(K)
+    num_dof = K.shape[0]
+    is_prescribed = np.zeros(num_dof, dtype=bool)
+    is_prescribed[prescribed_dofs] = True
+    free_dofs = np.flatnonzero(~is_prescribed)
+
+    u_prescribed = np.zeros(num_dof)
+    u_prescribed[prescribed_dofs] = prescribed_values
+    f_lifted = f - K @ u_prescribed
+
+    match method:
+        case "elimination":
+            K_constrained = K[free_dofs][:, free_dofs]
+            f_constrained = f_lifted[free_dofs]
+
+        case "lifting":
+            keep = scipy.sparse.diags((~is_prescribed).astype(np.float64))
+            K_constrained = (keep @ K @ keep + scipy.sparse.diags(is_prescribed.astype(np.float64))).tocsr()
+            f_constrained = f_lifted
+            f_constrained[prescribed_dofs] = prescribed_values
+
+        case _:
+            raise ValueError(f"Unknown method to apply Dirichlet boundary conditions. method = {method}")
+
+    return ConstrainedSystem(K_constrained, f_constrained, num_dof, free_dofs, prescribed_dofs, prescribed_values)
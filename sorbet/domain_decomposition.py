@@ -0,0 +1,580 @@
+"""
+Domain decomposition: parallel solution with overlapping subdomains in persistent worker processes
+
+The elements are partitioned on their face adjacency graph, every subdomain is grown by layers of neighboring
+elements, and each worker process assembles and factorizes its subdomain matrices once. The global system is then
+solved with conjugate gradients preconditioned by additive Schwarz, where the global matrix is never assembled: its
+products are summed from the subdomains. Vectors, residuals, and local corrections are exchanged through shared
+memory and the pipes to the workers only carry short commands.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+import scipy.linalg
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
+
+import sorbet
+
+
+def element_adjacency(elements: npt.NDArray[np.int64]) -> scipy.sparse.csr_matrix:
+    """Dual graph of the mesh: elements are adjacent if they share a face, shape (num_elements, num_elements)"""
+
+    num_elements = elements.shape[0]
+    num_faces_per_element = sorbet.topology.HEXAHEDRON_FACES.shape[0]
+    faces = np.sort(elements[:, sorbet.topology.HEXAHEDRON_FACES].reshape(-1, 4), axis=1)
+    _, inverse = np.unique(faces, axis=0, return_inverse=True)
+    order = np.argsort(inverse.ravel(), kind="stable")
+    face_ids = inverse.ravel()[order]
+    face_elements = order // num_faces_per_element
+    shared = np.flatnonzero(face_ids[1:] == face_ids[:-1])  # inner faces appear twice, next to each other
+    rows = np.concatenate([face_elements[shared], face_elements[shared + 1]])
+    cols = np.concatenate([face_elements[shared + 1], face_elements[shared]])
+    return scipy.sparse.csr_matrix((np.ones(rows.shape[0]), (rows, cols)), shape=(num_elements, num_elements))
+
+
+def _graph_growing_order(graph: scipy.sparse.csr_matrix) -> npt.NDArray[np.int64]:
+    """Vertices in breadth-first order from a pseudo-peripheral vertex, unreachable vertices last"""
+
+    start = 0
+    for _ in range(2):  # the last vertex reached is far away from the start
+        start = scipy.sparse.csgraph.breadth_first_order(graph, start, directed=False, return_predecessors=False)[-1]
+    order = scipy.sparse.csgraph.breadth_first_order(graph, start, directed=False, return_predecessors=False)
+    if order.shape[0] < graph.shape[0]:
+        order = np.concatenate([order, np.setdiff1d(np.arange(graph.shape[0]), order)])
+    return order
+
+
+def partition_elements(elements: npt.NDArray[np.int64], num_subdomains: int, adjacency: scipy.sparse.csr_matrix | None = None) -> npt.NDArray[np.int64]:
+    """
+    Subdomain of every element, by recursive graph-growing bisection of the element adjacency graph
+
+    Every bisection grows one part breadth-first from a pseudo-peripheral element until it holds its share of the
+    elements, which gives compact, connected parts for meshes of convex bodies. Any number of subdomains is possible,
+    the sizes differ by at most one element per bisection level.
+    """
+
+    if adjacency is None:
+        adjacency = element_adjacency(elements)
+    partition = np.zeros(elements.shape[0], dtype=np.int64)
+
+    def bisect(element_ids: npt.NDArray[np.int64], first_subdomain: int, num_parts: int) -> None:
+        if num_parts == 1:
+            partition[element_ids] = first_subdomain
+            return
+        num_parts_first = num_parts // 2
+        order = element_ids[_graph_growing_order(adjacency[element_ids][:, element_ids])]
+        num_first = round(element_ids.shape[0] * num_parts_first / num_parts)
+        bisect(order[:num_first], first_subdomain, num_parts_first)
+        bisect(order[num_first:], first_subdomain + num_parts_first, num_parts - num_parts_first)
+
+    bisect(np.arange(elements.shape[0]), 0, num_subdomains)
+    return partition
+
+
+def grow_subdomain(
+    element_mask: npt.NDArray[np.bool_],
+    incidence: scipy.sparse.csr_matrix,
+    num_layers: int,
+) -> npt.NDArray[np.bool_]:
+    """Add `num_layers` layers of elements sharing a node with the subdomain, `incidence` is element-by-node"""
+
+    for _ in range(num_layers):
+        node_mask = incidence.T @ element_mask.astype(np.float64) > 0.0
+        element_mask = incidence @ node_mask.astype(np.float64) > 0.0
+    return element_mask
+
+
+# state of a worker process, set by `_initialize_worker`
+_worker_arrays = {}
+_worker_shared_memory = []
+
+
+def _initialize_worker(array_specs: dict, scalar_material_parameters: dict) -> dict:
+    """Attach to the shared arrays, returns the material parameters (per-element ones are shared as `material_<name>`)"""
+
+    material_parameters = dict(scalar_material_parameters)
+    for name, (shm_name, shape, dtype) in array_specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shared_memory.append(shm)  # keep the block alive as long as the worker
+        _worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if name.startswith("material_"):
+            material_parameters[name.removeprefix("material_")] = _worker_arrays[name]
+    return material_parameters
+
+
+def _assemble_elements(element_ids: npt.NDArray[np.int64], material_parameters: dict, assembly_options: dict) -> tuple[scipy.sparse.csr_matrix, npt.NDArray[np.int64]]:
+    """Stiffness matrix of a subset of the elements in local numbering, and the global DOF of every local DOF"""
+
+    elements = _worker_arrays["elements"][element_ids]
+    local_nodes, local_elements = np.unique(elements, return_inverse=True)
+    K = sorbet.fem.assemble_global_stiffness_matrix(
+        _worker_arrays["nodes"][local_nodes],
+        local_elements.reshape(elements.shape),
+        sorbet.fem.select_elements(material_parameters, element_ids),
+        **assembly_options,
+    )
+    return K, (3 * local_nodes[:, None] + np.arange(3)).ravel()
+
+
+def _setup_subdomain(subdomain: dict, material_parameters: dict, assembly_options: dict) -> tuple[scipy.sparse.linalg.SuperLU, scipy.sparse.csr_matrix, dict]:
+    """
+    Factorize the global stiffness matrix restricted to the free DOFs of a subdomain, R K R^T, and assemble the core
+
+    The rows of nodes on the artificial boundary need the elements just outside of the subdomain, hence all
+    elements touching a subdomain node are assembled (in local numbering) before restricting. The matrix of the
+    core elements (without overlap) is kept for the global matrix-vector product, since the cores of all
+    subdomains partition the elements.
+    """
+
+    start = time.perf_counter()
+    K, assembly_dofs = _assemble_elements(subdomain["assembly_elements"], material_parameters, assembly_options)
+    local_dofs = np.searchsorted(assembly_dofs, subdomain["dofs"])
+    K_core, _ = _assemble_elements(subdomain["core_elements"], material_parameters, assembly_options)
+    assembly_time = time.perf_counter() - start
+
+    factor = scipy.sparse.linalg.splu(
+        K[local_dofs][:, local_dofs].tocsc(),
+        permc_spec="MMD_AT_PLUS_A",
+        diag_pivot_thresh=0.0,
+        options={"SymmetricMode": True},
+    )
+    statistics = {
+        "assembly_time": assembly_time,
+        "factorization_time": time.perf_counter() - start - assembly_time,
+        "factor_nnz": factor.L.nnz + factor.U.nnz,
+    }
+    return factor, K_core, statistics
+
+
+def _worker_main(
+    connection,
+    worker_index: int,
+    array_specs: dict,
+    subdomains: list[dict],
+    scalar_material_parameters: dict,
+    assembly_options: dict,
+) -> None:
+    """
+    Event loop of a worker process owning some subdomains
+
+    After the setup, the worker replies with the statistics and the contributions Z_i^T K_i Z_i of its subdomain
+    cores to the coarse matrix. Commands:
+    - "apply": add the local corrections R^T A^-1 R r of all owned subdomains for the residual in shared memory to
+      the worker's row of the shared corrections
+    - "matvec": add the products of the core matrices with the shared vector to the worker's row of the shared products
+    - "close": end the process
+    Replies carry the time per subdomain or an error.
+    """
+
+    try:
+        material_parameters = _initialize_worker(array_specs, scalar_material_parameters)
+        factors, core_matrices, statistics, coarse_matrices = [], [], [], []
+        for subdomain in subdomains:
+            factor, K_core, subdomain_statistics = _setup_subdomain(subdomain, material_parameters, assembly_options)
+            factors.append(factor)
+            core_matrices.append(K_core)
+            statistics.append(subdomain_statistics)
+            if subdomain["coarse_modes"] is not None:
+                coarse_matrices.append((subdomain["coarse_modes"].T @ (K_core @ subdomain["coarse_modes"])).toarray())
+        connection.send(("ready", (statistics, sum(coarse_matrices) if coarse_matrices else None)))
+
+        residual, vector = _worker_arrays["residual"], _worker_arrays["vector"]
+        corrections, products = _worker_arrays["corrections"][worker_index], _worker_arrays["products"][worker_index]
+        while (command := connection.recv()) != "close":
+            times = []
+            output = corrections if command == "apply" else products
+            output[:] = 0.0
+            for subdomain, factor, K_core in zip(subdomains, factors, core_matrices):
+                start = time.perf_counter()
+                if command == "apply":
+                    corrections[subdomain["free_positions"]] += factor.solve(residual[subdomain["free_positions"]])
+                else:
+                    products[subdomain["core_dofs"]] += K_core @ vector[subdomain["core_dofs"]]
+                times.append(time.perf_counter() - start)
+            connection.send(("done", times))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        _worker_arrays.clear()
+        for shm in _worker_shared_memory:
+            shm.close()
+        connection.close()
+
+
+class SchwarzSolver:
+    """
+    Conjugate gradients with a two-level additive Schwarz preconditioner on overlapping subdomains
+
+    The elements are partitioned into `num_subdomains` subdomains (see `partition_elements`), each grown by `overlap`
+    layers of elements (see `grow_subdomain`). The subdomains are distributed over `num_workers` persistent processes,
+    balanced by their number of DOFs, which assemble and factorize them once. The main process never holds a global
+    matrix: the matrix-vector products of CG are sums of the products with the core matrices of all subdomains,
+    computed by the workers. Every preconditioner application M^-1 r = sum_i R_i^T A_i^-1 R_i r + Z (Z^T K Z)^-1 Z^T r
+    solves all subdomains in parallel, while the main process applies the coarse correction with the rigid body modes
+    of every subdomain as columns of Z (if `coarse_space=True`), which keeps the number of iterations from growing
+    with the number of subdomains. Use as context manager or call `close` to stop the workers.
+    """
+
+    def __init__(
+        self,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        material_parameters: dict,
+        prescribed_dofs: npt.NDArray[np.int64],
+        num_subdomains: int | None = None,
+        num_workers: int | None = None,
+        overlap: int = 1,
+        coarse_space: bool = True,
+        **assembly_options,
+    ):
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        if num_subdomains is None:
+            num_subdomains = num_workers
+        num_workers = min(num_workers, num_subdomains)
+        self.num_workers = num_workers
+        self.num_subdomains = num_subdomains
+        self.prescribed_dofs = np.asarray(prescribed_dofs, dtype=np.int64)
+        self._workers = []
+        self._shared_blocks = []
+
+        setup_start = time.perf_counter()
+        sorbet.log.start("domain decomposition setup")
+        num_nodes = nodes.shape[0]
+        num_elements = elements.shape[0]
+        self.num_dof = 3 * num_nodes
+        is_prescribed = np.zeros(self.num_dof, dtype=bool)
+        is_prescribed[self.prescribed_dofs] = True
+        self.free_dofs = np.flatnonzero(~is_prescribed)
+        free_positions = np.full(self.num_dof, -1, dtype=np.int64)
+        free_positions[self.free_dofs] = np.arange(self.free_dofs.shape[0])
+        self.operator = scipy.sparse.linalg.LinearOperator((self.free_dofs.shape[0],) * 2, matvec=self._free_matvec, dtype=np.float64)
+
+        # subdomains: core elements, overlapping elements, their free DOFs, and the elements needed to assemble them
+        adjacency = element_adjacency(elements)
+        self.partition = partition_elements(elements, num_subdomains, adjacency)
+        incidence = scipy.sparse.csr_matrix(
+            (np.ones(elements.size), (np.repeat(np.arange(num_elements), elements.shape[1]), elements.ravel())),
+            shape=(num_elements, num_nodes),
+        )
+        Z = self._coarse_modes(nodes, elements, is_prescribed) if coarse_space else None
+        subdomains = []
+        for subdomain_index in range(num_subdomains):
+            core_elements = np.flatnonzero(self.partition == subdomain_index)
+            core_nodes = np.unique(elements[core_elements])
+            core_dofs = (3 * core_nodes[:, None] + np.arange(3)).ravel()
+            element_mask = grow_subdomain(self.partition == subdomain_index, incidence, overlap)
+            subdomain_nodes = np.unique(elements[element_mask])
+            dofs = (3 * subdomain_nodes[:, None] + np.arange(3)).ravel()
+            dofs = dofs[~is_prescribed[dofs]]
+            subdomains.append(
+                {
+                    "index": subdomain_index,
+                    "num_core_elements": core_elements.shape[0],
+                    "num_elements": int(np.count_nonzero(element_mask)),
+                    "core_elements": core_elements,
+                    "core_dofs": core_dofs,
+                    "coarse_modes": None if Z is None else Z[core_dofs],
+                    "assembly_elements": np.flatnonzero(grow_subdomain(element_mask, incidence, 1)),
+                    "dofs": dofs,
+                    "free_positions": free_positions[dofs],
+                }
+            )
+        cut_edges = self.partition[adjacency.tocoo().row] != self.partition[adjacency.tocoo().col]
+        self.edge_cut = int(np.count_nonzero(cut_edges)) // 2
+
+        # distribute the subdomains over the workers, largest first to the least loaded worker
+        self.worker_subdomains = [[] for _ in range(num_workers)]
+        worker_loads = np.zeros(num_workers)
+        for subdomain in sorted(subdomains, key=lambda subdomain: -subdomain["dofs"].shape[0]):
+            worker_index = int(np.argmin(worker_loads))
+            self.worker_subdomains[worker_index].append(subdomain)
+            worker_loads[worker_index] += subdomain["dofs"].shape[0]
+
+        try:
+            coarse_matrix = self._start_workers(nodes, elements, material_parameters, assembly_options)
+        except BaseException:
+            self.close()
+            raise
+        self.coarse_space = None if Z is None else (Z[self.free_dofs].tocsr(), scipy.linalg.cho_factor(coarse_matrix))
+        self.setup_time = time.perf_counter() - setup_start
+        sorbet.log.end("domain decomposition setup")
+        self.apply_times = [0.0] * num_subdomains
+        self.matvec_times = [0.0] * num_subdomains
+        self.worker_wait_time = 0.0
+        self.num_applications = 0
+
+    def _coarse_modes(self, nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64], is_prescribed: npt.NDArray[np.bool_]) -> scipy.sparse.csr_matrix:
+        """Rigid body modes of the non-overlapping subdomains as columns of Z, shape (num_dof, num_modes), zero at prescribed DOFs"""
+
+        node_subdomains = np.full(nodes.shape[0], -1, dtype=np.int64)  # nodes on interfaces go to any adjacent subdomain
+        node_subdomains[elements.ravel()] = np.repeat(self.partition, elements.shape[1])
+        modes = np.zeros((nodes.shape[0], 3, 6))
+        for subdomain_index in range(self.num_subdomains):
+            in_subdomain = node_subdomains == subdomain_index
+            if np.any(in_subdomain):
+                modes[in_subdomain] = sorbet.fem.rigid_body_modes(nodes[in_subdomain])
+        rows = np.broadcast_to(np.arange(self.num_dof).reshape(-1, 3, 1), modes.shape)
+        cols = np.broadcast_to(6 * node_subdomains[:, None, None] + np.arange(6), modes.shape)
+        keep = ~is_prescribed[rows] & (cols >= 0) & (modes != 0.0)
+        Z = scipy.sparse.csr_matrix((modes[keep], (rows[keep], cols[keep])), shape=(self.num_dof, 6 * self.num_subdomains))
+        return Z[:, np.flatnonzero(Z.getnnz(axis=0))].tocsr()  # e.g. modes of subdomains without free DOFs
+
+    def _start_workers(
+        self,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        material_parameters: dict,
+        assembly_options: dict,
+    ) -> npt.NDArray[np.float64] | None:
+        """Start the workers and wait for their setup, returns the coarse matrix Z^T K Z (summed over the workers)"""
+
+        scalar_material_parameters, material_arrays = sorbet.parallel.split_material_parameters(material_parameters)
+        shared_arrays = {}
+        for name, array in [("nodes", nodes), ("elements", elements)] + material_arrays:
+            shm, shared_arrays[name] = sorbet.parallel._create_shared_array(array.shape, array.dtype)
+            shared_arrays[name][...] = array
+            self._shared_blocks.append(shm)
+        num_free = self.free_dofs.shape[0]
+        for name, shape in (
+            ("residual", (num_free,)),
+            ("corrections", (self.num_workers, num_free)),
+            ("vector", (self.num_dof,)),
+            ("products", (self.num_workers, self.num_dof)),
+        ):
+            shm, shared_arrays[name] = sorbet.parallel._create_shared_array(shape, np.float64)
+            self._shared_blocks.append(shm)
+        array_specs = {name: (shm.name, array.shape, array.dtype) for shm, (name, array) in zip(self._shared_blocks, shared_arrays.items())}
+        self.residual = shared_arrays["residual"]
+        self.corrections = shared_arrays["corrections"]
+        self.vector = shared_arrays["vector"]
+        self.products = shared_arrays["products"]
+
+        for worker_index, subdomains in enumerate(self.worker_subdomains):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(worker_connection, worker_index, array_specs, subdomains, scalar_material_parameters, assembly_options),
+                daemon=True,
+            )
+            process.start()
+            worker_connection.close()
+            self._workers.append((process, connection))
+
+        self.subdomain_statistics: list[dict] = [{}] * self.num_subdomains  # filled in below
+        coarse_matrix = None
+        for (_, connection), subdomains in zip(self._workers, self.worker_subdomains):
+            statistics, worker_coarse_matrix = self._receive(connection)
+            if worker_coarse_matrix is not None:
+                coarse_matrix = worker_coarse_matrix if coarse_matrix is None else coarse_matrix + worker_coarse_matrix
+            for subdomain, subdomain_statistics in zip(subdomains, statistics):
+                self.subdomain_statistics[subdomain["index"]] = {
+                    "num_core_elements": subdomain["num_core_elements"],
+                    "num_elements": subdomain["num_elements"],
+                    "num_dof": int(subdomain["dofs"].shape[0]),
+                    **subdomain_statistics,
+                }
+        sorbet.log.count("factor_nnz", sum(statistics["factor_nnz"] for statistics in self.subdomain_statistics))
+        return coarse_matrix
+
+    @staticmethod
+    def _receive(connection):
+        status, payload = connection.recv()
+        if status == "error":
+            raise RuntimeError(f"Domain decomposition worker failed:\n{payload}")
+        return payload
+
+    def _run(self, command: str, times: list[float]) -> None:
+        """Send a command to all workers and wait for them, adding the time of every subdomain to `times`"""
+
+        for _, connection in self._workers:
+            connection.send(command)
+        wait_start = time.perf_counter()
+        for (_, connection), subdomains in zip(self._workers, self.worker_subdomains):
+            for subdomain, subdomain_time in zip(subdomains, self._receive(connection)):
+                times[subdomain["index"]] += subdomain_time
+        self.worker_wait_time += time.perf_counter() - wait_start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self) -> None:
+        """Stop the worker processes and release the shared memory"""
+
+        for process, connection in self._workers:
+            try:
+                connection.send("close")
+            except (BrokenPipeError, OSError):
+                pass  # worker already ended
+            process.join(timeout=10.0)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self._workers = []
+        self.residual = self.corrections = self.vector = self.products = None  # release the buffers before closing the shared memory
+        for shm in self._shared_blocks:
+            shm.close()
+            shm.unlink()
+        self._shared_blocks = []
+
+    def matvec(self, u: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """Global product K @ u for displacements of all DOFs, as sum of the products with the subdomain cores"""
+
+        self.vector[:] = u
+        self._run("matvec", self.matvec_times)
+        return self.products.sum(axis=0)
+
+    def _free_matvec(self, u_free: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        u = np.zeros(self.num_dof)
+        u[self.free_dofs] = u_free.ravel()
+        return self.matvec(u)[self.free_dofs]
+
+    def apply_preconditioner(self, r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """Additive Schwarz preconditioner for residuals of the free DOFs (the callable passed to CG)"""
+
+        self.residual[:] = r
+        for _, connection in self._workers:
+            connection.send("apply")
+        z = np.zeros(r.shape[0])
+        if self.coarse_space is not None:
+            Z, coarse_factor = self.coarse_space
+            z += Z @ scipy.linalg.cho_solve(coarse_factor, Z.T @ r)  # while the workers solve the subdomains
+
+        wait_start = time.perf_counter()
+        for (_, connection), subdomains in zip(self._workers, self.worker_subdomains):
+            for subdomain, apply_time in zip(subdomains, self._receive(connection)):
+                self.apply_times[subdomain["index"]] += apply_time
+        self.worker_wait_time += time.perf_counter() - wait_start
+        self.num_applications += 1
+        sorbet.log.count("schwarz_applications")
+        return z + self.corrections.sum(axis=0)
+
+    @sorbet.log.span("domain_decomposition_solve")
+    def solve(
+        self,
+        f: npt.NDArray[np.float64],
+        prescribed_values: npt.NDArray[np.float64],
+        u0: npt.NDArray[np.float64] | None = None,
+        rtol: float = 1e-8,
+        max_iterations: int = 1000,
+    ) -> tuple[npt.NDArray[np.float64], dict]:
+        """Displacements of all DOFs for forces `f` and `prescribed_values` (ordered as `prescribed_dofs`), and the CG info"""
+
+        u = np.zeros(self.num_dof)
+        u[self.prescribed_dofs] = prescribed_values
+        f_free = (f - self.matvec(u))[self.free_dofs]
+        u_free, info = sorbet.solvers.conjugate_gradient(
+            self.operator,
+            f_free,
+            preconditioner=self.apply_preconditioner,
+            u0=None if u0 is None else u0[self.free_dofs],
+            rtol=rtol,
+            max_iterations=max_iterations,
+            log_every=0,
+        )
+        u[self.free_dofs] = u_free
+        self.log_load_balance()
+        return u, info
+
+    def load_balance(self) -> dict:
+        """
+        Per-subdomain sizes and times, and the imbalance (maximum over mean) of the work per worker
+
+        Work is the setup (assembly and factorization) and the accumulated subdomain solves of all preconditioner
+        applications so far.
+        """
+
+        subdomains = [{**statistics, "apply_time": apply_time} for statistics, apply_time in zip(self.subdomain_statistics, self.apply_times)]
+        worker_setup = np.array([sum(subdomains[s["index"]]["assembly_time"] + subdomains[s["index"]]["factorization_time"] for s in worker) for worker in self.worker_subdomains])
+        worker_apply = np.array([sum(subdomains[s["index"]]["apply_time"] for s in worker) for worker in self.worker_subdomains])
+        num_dof = np.array([subdomain["num_dof"] for subdomain in subdomains])
+        return {
+            "num_subdomains": self.num_subdomains,
+            "num_workers": self.num_workers,
+            "edge_cut": self.edge_cut,
+            "subdomains": subdomains,
+            "dof_imbalance": float(num_dof.max() / num_dof.mean()),
+            "setup_imbalance": float(worker_setup.max() / worker_setup.mean()) if worker_setup.mean() > 0.0 else 1.0,
+            "apply_imbalance": float(worker_apply.max() / worker_apply.mean()) if worker_apply.mean() > 0.0 else 1.0,
+            "setup_time": self.setup_time,
+            "num_applications": self.num_applications,
+            "worker_wait_time": self.worker_wait_time,
+        }
+
+    def log_load_balance(self) -> dict:
+        summary = self.load_balance()
+        lines = [
+            f"Domain decomposition: {summary['num_subdomains']} subdomains on {summary['num_workers']} workers, edge cut = {summary['edge_cut']} faces, "
+            f"imbalance (max / mean) of DOFs {summary['dof_imbalance']:.2f}, setup {summary['setup_imbalance']:.2f}, solves {summary['apply_imbalance']:.2f}"
+        ]
+        for index, subdomain in enumerate(summary["subdomains"]):
+            lines.append(
+                f"  subdomain {index}: {subdomain['num_core_elements']} elements ({subdomain['num_elements']} with overlap), {subdomain['num_dof']} DOFs, "
+                f"factor nnz = {subdomain['factor_nnz']}, assembly {subdomain['assembly_time']:.3f} s, factorization {subdomain['factorization_time']:.3f} s, "
+                f"solves {subdomain['apply_time']:.3f} s"
+            )
+        logging.info("\n".join(lines))
+        return summary
+
+
+def strong_scaling(
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    material_parameters: dict,
+    prescribed_dofs: npt.NDArray[np.int64],
+    prescribed_values: npt.NDArray[np.float64],
+    worker_counts: list[int],
+    num_subdomains: int | None = None,
+    f: npt.NDArray[np.float64] | None = None,
+    **solver_options,
+) -> list[dict]:
+    """
+    Time setup and solve of the same problem for every number of workers, with speedup and efficiency relative to the first
+
+    The number of subdomains is fixed (the largest worker count by default), so every run performs the same
+    arithmetic and only the number of processes sharing it changes. Efficiency is T_1 p_1 / (T_p p).
+    """
+
+    if num_subdomains is None:
+        num_subdomains = max(worker_counts)
+    if f is None:
+        f = np.zeros(3 * nodes.shape[0])
+    results = []
+    for num_workers in worker_counts:
+        start = time.perf_counter()
+        with SchwarzSolver(nodes, elements, material_parameters, prescribed_dofs, num_subdomains, num_workers, **solver_options) as solver:
+            setup_time = time.perf_counter() - start
+            _, info = solver.solve(f, prescribed_values)
+            summary = solver.load_balance()
+        results.append(
+            {
+                "num_workers": num_workers,
+                "setup_time": setup_time,
+                "solve_time": time.perf_counter() - start - setup_time,
+                "total_time": time.perf_counter() - start,
+                "iterations": info["iterations"],
+                "apply_imbalance": summary["apply_imbalance"],
+                "setup_imbalance": summary["setup_imbalance"],
+            }
+        )
+    reference = results[0]
+    for result in results:
+        result["speedup"] = reference["total_time"] / result["total_time"]
+        result["efficiency"] = result["speedup"] * reference["num_workers"] / result["num_workers"]
+        logging.info(
+            f"Strong scaling: {result['num_workers']} workers, setup {result['setup_time']:.3f} s, solve {result['solve_time']:.3f} s "
+            f"({result['iterations']} iterations), speedup {result['speedup']:.2f}, efficiency {100.0 * result['efficiency']:.0f} %"
+        )
+    return results
@@ -1,6 +1,10 @@
+import functools
+
 import numpy as np
 from numpy.typing import NDArray
 
+import sorbet
+
 
 def linear_shape_functions(xi: float, eta: float, zeta: float) -> NDArray[np.float64]:
     N = np.zeros(8)
@@ -53,6 +57,34 @@ def linear_shape_function_derivatives(xi: float, eta: float, zeta: float) -> NDA
     return dN
 
 
+def linear_shape_functions_batched(points: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Batched version of `linear_shape_functions` for reference coordinates of shape (..., 3), returns (..., 8)"""
+
+    signs = node_reference_coordinates()
+    return 0.125 * np.prod(1.0 + points[..., None, :] * signs, axis=-1)
+
+
+def linear_shape_function_derivatives_batched(points: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Batched version of `linear_shape_function_derivatives` for reference coordinates of shape (..., 3), returns (..., 8, 3)"""
+
+    signs = node_reference_coordinates()
+    factors = 1.0 + points[..., None, :] * signs  # (..., 8, 3)
+    dN = np.empty(factors.shape)
+    dN[..., 0] = 0.125 * signs[:, 0] * factors[..., 1] * factors[..., 2]
+    dN[..., 1] = 0.125 * signs[:, 1] * factors[..., 0] * factors[..., 2]
+    dN[..., 2] = 0.125 * signs[:, 2] * factors[..., 0] * factors[..., 1]
+    return dN
+
+
+@functools.cache
+def node_reference_coordinates() -> NDArray[np.float64]:
+    """Reference coordinates (corners of [-1, 1]^3) of the eight nodes, shape (8, 3)"""
+
+    signs = np.sign(gauss_quadrature(num_points=8)[0])  # Gauss points of the 2x2x2 rule are in node order
+    signs.flags.writeable = False  # cached, hence shared between callers
+    return signs
+
+
 def B_operator(dN, J):
     dN_phys = dN @ np.linalg.inv(J)
     B = np.zeros((6, 24))
@@ -68,6 +100,37 @@ def B_operator(dN, J):
     return B
 
 
+def B_operators(dN_phys: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Batched version of `B_operator` for physical derivatives of shape (..., 8, 3)"""
+
+    B = np.zeros(dN_phys.shape[:-2] + (6, 24))
+    B[..., 0, 0::3] = dN_phys[..., 0]
+    B[..., 1, 1::3] = dN_phys[..., 1]
+    B[..., 2, 2::3] = dN_phys[..., 2]
+    B[..., 3, 0::3] = dN_phys[..., 1]
+    B[..., 3, 1::3] = dN_phys[..., 0]
+    B[..., 4, 0::3] = dN_phys[..., 2]
+    B[..., 4, 2::3] = dN_phys[..., 0]
+    B[..., 5, 1::3] = dN_phys[..., 2]
+    B[..., 5, 2::3] = dN_phys[..., 1]
+    return B
+
+
+def rigid_body_modes(nodes: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Three translations and three rotations (about the centroid) as nodal displacements, shape (num_nodes, 3, 6)"""
+
+    x, y, z = (nodes - nodes.mean(axis=0)).T
+    zeros, ones = np.zeros(nodes.shape[0]), np.ones(nodes.shape[0])
+    return np.stack(
+        [
+            np.stack([ones, zeros, zeros, zeros, z, -y], axis=1),
+            np.stack([zeros, ones, zeros, -z, zeros, x], axis=1),
+            np.stack([zeros, zeros, ones, y, -x, zeros], axis=1),
+        ],
+        axis=1,
+    )
+
+
 def gauss_quadrature(num_points: int = 8) -> tuple[NDArray[np.float64], NDArray[np.float64]]:
     match num_points:
         case 1:
@@ -124,23 +187,161 @@ def gauss_quadrature(num_points: int = 8) -> tuple[NDArray[np.float64], NDArray[
             raise NotImplementedError(f"Currently only supporting 1/4/6/8 Gauss points. num_points = {num_points}")
 
 
-def linear_elastic_material_tangent(E: float, nu: float) -> NDArray[np.float64]:
+def lame_parameters(E: float, nu: float) -> tuple[float, float]:
     lmb = (E * nu) / ((1.0 + nu) * (1.0 - 2.0 * nu))  # Lamé's first parameter
     mu = E / (2.0 * (1.0 + nu))  # Lamé's second parameter (shear modulus)
-    C = np.zeros((6, 6))
-    C[0, :] = lmb + 2.0 * mu, lmb, lmb, 0.0, 0.0, 0.0
-    C[1, :] = lmb, lmb + 2.0 * mu, lmb, 0.0, 0.0, 0.0
-    C[2, :] = lmb, lmb, lmb + 2.0 * mu, 0.0, 0.0, 0.0
-    C[3, :] = 0.0, 0.0, 0.0, mu, 0.0, 0.0
-    C[4, :] = 0.0, 0.0, 0.0, 0.0, mu, 0.0
-    C[5, :] = 0.0, 0.0, 0.0, 0.0, 0.0, mu
+    return lmb, mu
+
+
+@functools.cache
+def linear_elastic_material_tangent(E: float, nu: float) -> NDArray[np.float64]:
+    lmb, mu = lame_parameters(E, nu)
+    C = lmb * lame_material_tangents()[0] + mu * lame_material_tangents()[1]
+    C.flags.writeable = False  # cached, hence shared between callers
     return C
 
 
-def element_stiffness_matrix(element_nodes, material_parameters):
+@functools.cache
+def lame_material_tangents() -> tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """Tangents C_lambda and C_mu with C = lambda * C_lambda + mu * C_mu"""
+
+    C_lambda = np.zeros((6, 6))
+    C_lambda[:3, :3] = 1.0
+    C_mu = np.diag([2.0, 2.0, 2.0, 1.0, 1.0, 1.0])
+    for C in (C_lambda, C_mu):
+        C.flags.writeable = False  # cached, hence shared between callers
+    return C_lambda, C_mu
+
+
+def linear_elastic_material_tangents(E: NDArray[np.float64], nu: NDArray[np.float64]) -> NDArray[np.float64]:
+    """Batched version of `linear_elastic_material_tangent` with shape (num_materials, 6, 6)"""
+
+    lmb, mu = lame_parameters(np.asarray(E, dtype=np.float64), np.asarray(nu, dtype=np.float64))
+    C_lambda, C_mu = lame_material_tangents()
+    return lmb[:, None, None] * C_lambda + mu[:, None, None] * C_mu
+
+
+def is_heterogeneous(material_parameters: dict) -> bool:
+    """Whether any material parameter is given per element instead of as a single value"""
+
+    return any(np.ndim(value) > 0 for value in material_parameters.values())
+
+
+def unique_materials(material_parameters: dict, num_elements: int) -> tuple[NDArray[np.float64], NDArray[np.float64], NDArray[np.int64]]:
+    """
+    Unique (E, nu) pairs of per-element material parameters
+
+    Returns `(E, nu, material_ids)` with one entry per unique material in `E` and `nu`, and the index of the material
+    of every element in `material_ids`. Scalar parameters are broadcast to all elements.
+    """
+
+    E = np.broadcast_to(np.asarray(material_parameters["E"], dtype=np.float64), (num_elements,))
+    nu = np.broadcast_to(np.asarray(material_parameters["nu"], dtype=np.float64), (num_elements,))
+    materials, material_ids = np.unique(np.stack([E, nu], axis=1), axis=0, return_inverse=True)
+    return materials[:, 0], materials[:, 1], material_ids.ravel()
+
+
+def select_elements(material_parameters: dict, element_ids: NDArray[np.int64] | slice) -> dict:
+    """Material parameters of a subset of the elements (scalar parameters are kept as they are, sequences become arrays)"""
+
+    return {name: np.asarray(value)[element_ids] if np.ndim(value) > 0 else value for name, value in material_parameters.items()}
+
+
+def element_material_parameters(element_groups: NDArray[np.int64], group_material_parameters: dict[int, dict]) -> dict:
+    """
+    Per-element material parameters from one set of parameters per element group
+
+    `element_groups` holds the group of every element, e.g. the physical group from
+    `sorbet.mesh.GmshManager.get_element_physical_groups`, and `group_material_parameters` maps every group to
+    `{"E": ..., "nu": ...}`.
+    """
+
+    missing_groups = set(np.unique(element_groups).tolist()) - set(group_material_parameters)
+    if missing_groups:
+        raise ValueError(f"No material parameters given for element groups {sorted(missing_groups)}")
+    groups = np.array(sorted(group_material_parameters))
+    group_index = np.searchsorted(groups, element_groups)
+    return {name: np.array([group_material_parameters[group][name] for group in groups], dtype=np.float64)[group_index] for name in ("E", "nu")}
+
+
+@functools.cache
+def reference_element(num_points: int = 8) -> tuple[NDArray[np.float64], NDArray[np.float64], NDArray[np.float64]]:
+    """Gauss points, weights, and shape function derivatives at all Gauss points (cached per quadrature rule)"""
+
+    points, weights = gauss_quadrature(num_points)
+    dN = np.array([linear_shape_function_derivatives(xi, eta, zeta) for xi, eta, zeta in points])  # (num_points, 8, 3)
+    for array in (points, weights, dN):
+        array.flags.writeable = False  # cached, hence shared between callers
+    return points, weights, dN
+
+
+_congruent_element_statistics = {"hits": 0, "misses": 0}
+
+
+def cache_info() -> dict:
+    """Hit/miss counters of the reference element, material tangent, and congruent element caches"""
+
+    return {
+        "reference_element": reference_element.cache_info()._asdict(),
+        "material_tangent": linear_elastic_material_tangent.cache_info()._asdict(),
+        "congruent_elements": dict(_congruent_element_statistics),
+    }
+
+
+def cache_clear() -> None:
+    """Reset all caches and counters of `cache_info`"""
+
+    reference_element.cache_clear()
+    linear_elastic_material_tangent.cache_clear()
+    _congruent_element_statistics.update(hits=0, misses=0)
+
+
+def congruent_element_groups(
+    element_nodes: NDArray[np.float64],
+    rtol: float = 1e-10,
+    material_ids: NDArray[np.int64] | None = None,
+) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Group elements that are congruent up to translation
+
+    The fingerprint of an element are its node coordinates relative to its first node, rounded to `rtol` times
+    the largest element extent, and its material (if `material_ids` are given, see `unique_materials`). Returns `(representatives, inverse)` such that `representatives[inverse]` gives
+    for every element the index of an element with the same geometry. Hits and misses are counted in `cache_info`.
+    """
+
+    num_elements = element_nodes.shape[0]
+    relative_coordinates = (element_nodes - element_nodes[:, :1, :]).reshape(num_elements, -1)
+    resolution = rtol * np.abs(relative_coordinates).max()
+    if resolution == 0.0:
+        representatives, inverse = np.arange(num_elements), np.arange(num_elements)
+    else:
+        fingerprints = np.round(relative_coordinates / resolution).astype(np.int64)
+        if material_ids is not None:
+            fingerprints = np.column_stack([fingerprints, material_ids])
+        _, representatives, inverse = np.unique(fingerprints, axis=0, return_index=True, return_inverse=True)
+    _congruent_element_statistics["misses"] += representatives.shape[0]
+    _congruent_element_statistics["hits"] += num_elements - representatives.shape[0]
+    sorbet.log.count("congruent_element_hits", num_elements - representatives.shape[0])
+    return representatives, inverse.ravel()
+
+
+def check_stiffness_quadrature(num_points: int) -> None:
+    """
+    Reject quadrature rules that under-integrate the stiffness matrix
+
+    The 6-point rule leaves three spurious zero-energy modes per element (9 instead of 6 zero eigenvalues of K
+    for a free body). It is only meant for sampling Gauss point values, e.g. in `sorbet.post_processing`.
+    """
+
+    if num_points not in (1, 4, 8):
+        raise NotImplementedError(f"Currently only supporting 1/4/8 Gauss points for stiffness matrices. num_points = {num_points}")
+
+
+def element_stiffness_matrix(element_nodes, material_parameters, num_points: int = 8):
+    check_stiffness_quadrature(num_points)
     K_e = np.zeros((24, 24))
-    points, weights = gauss_quadrature(num_points=8)
-    C = linear_elastic_material_tangent(E=material_parameters["E"], nu=material_parameters["nu"])
+    points, weights, _ = reference_element(num_points)
+    C = linear_elastic_material_tangent(E=float(material_parameters["E"]), nu=float(material_parameters["nu"]))
     for (xi, eta, zeta), weight in zip(points, weights):
         dN = linear_shape_function_derivatives(xi, eta, zeta)
         J = element_nodes.T @ dN
@@ -149,15 +350,217 @@ def element_stiffness_matrix(element_nodes, material_parameters):
     return K_e
 
 
-def assemble_global_stiffness_matrix(nodes, elements, material_parameters):
+def element_stiffness_matrices(
+    element_nodes: NDArray[np.float64],
+    material_parameters: dict,
+    chunk_size: int = 4096,
+    reuse_congruent_elements: bool = False,
+    num_points: int = 8,
+    hourglass_stiffness: float = 0.1,
+) -> NDArray[np.float64]:
+    """
+    Compute the stiffness matrices of all elements at once
+
+    `element_nodes` has shape (num_elements, 8, 3), e.g. `nodes[elements]`, and the result has shape (num_elements, 24, 24).
+    Elements are processed in chunks of `chunk_size` to keep the temporary B arrays small.
+    With `reuse_congruent_elements=True`, the matrix is computed only once per group of elements that are congruent
+    up to translation (see `congruent_element_groups`), which pays off for structured meshes.
+    `num_points` selects the quadrature rule (1, 4, or 8 points, see `check_stiffness_quadrature`). One-point (reduced) integration is stabilized
+    against hourglass modes with `hourglass_stiffness` (see `hourglass_stabilization`), pass 0.0 to disable it.
+    `E` and `nu` in `material_parameters` are either scalars or arrays with one value per element. In the latter case,
+    the material tangent is computed once per unique material and looked up per element.
+    """
+
+    material_ids = None
+    if is_heterogeneous(material_parameters):
+        E, nu, material_ids = unique_materials(material_parameters, element_nodes.shape[0])
+
+    if reuse_congruent_elements:
+        representatives, inverse = congruent_element_groups(element_nodes, material_ids=material_ids)
+        material_parameters = select_elements(material_parameters, representatives)
+        return element_stiffness_matrices(element_nodes[representatives], material_parameters, chunk_size, False, num_points, hourglass_stiffness)[inverse]
+
+    if material_ids is None:
+        C = linear_elastic_material_tangent(E=float(material_parameters["E"]), nu=float(material_parameters["nu"]))
+    else:
+        C = linear_elastic_material_tangents(E, nu)
+    return _integrate_element_matrices(element_nodes, C, chunk_size, num_points, hourglass_stiffness, material_ids)
+
+
+@functools.cache
+def hourglass_base_vectors() -> NDArray[np.float64]:
+    """Nodal values of the four hourglass modes xi*eta, eta*zeta, zeta*xi, xi*eta*zeta, shape (8, 4)"""
+
+    xi, eta, zeta = node_reference_coordinates().T
+    h = np.stack([xi * eta, eta * zeta, zeta * xi, xi * eta * zeta], axis=1)
+    h.flags.writeable = False  # cached, hence shared between callers
+    return h
+
+
+def hourglass_stabilization(
+    element_nodes: NDArray[np.float64],
+    dN_phys: NDArray[np.float64],
+    volume: NDArray[np.float64],
+    C: NDArray[np.float64],
+    hourglass_stiffness: float,
+) -> NDArray[np.float64]:
+    """
+    Hourglass stiffness of one-point integrated elements (Flanagan and Belytschko, 1981)
+
+    `dN_phys` are the physical shape function derivatives at the element center, shape (num_elements, 8, 3),
+    and C is either one tangent for all elements or one per element.
+    The hourglass vectors gamma = h - dN_phys (X^T h) are orthogonal to all linear displacement fields, hence the
+    stabilization only acts on the modes not seen by the center point. They are scaled with
+    hourglass_stiffness * (lambda + 2 mu) * V * sum(dN_phys^2) / 8, which is linear in C.
+    """
+
+    h = hourglass_base_vectors()
+    gamma = h - dN_phys @ (np.swapaxes(element_nodes, 1, 2) @ h)  # (num_elements, 8, 4)
+    scaling = hourglass_stiffness * C[..., 0, 0] * volume * np.sum(dN_phys**2, axis=(1, 2)) / 8.0
+    G = scaling[:, None, None] * (gamma @ np.swapaxes(gamma, 1, 2))  # (num_elements, 8, 8)
+
+    K_hg = np.zeros((element_nodes.shape[0], 8, 3, 8, 3))
+    for i in range(3):
+        K_hg[:, :, i, :, i] = G
+    return K_hg.reshape(-1, 24, 24)
+
+
+def _integrate_element_matrices(
+    element_nodes: NDArray[np.float64],
+    C: NDArray[np.float64],
+    chunk_size: int,
+    num_points: int = 8,
+    hourglass_stiffness: float = 0.1,
+    material_ids: NDArray[np.int64] | None = None,
+) -> NDArray[np.float64]:
+    """
+    Element stiffness matrices for the material tangent C, see `element_stiffness_matrices`
+
+    With `material_ids`, C holds one tangent per unique material, shape (num_materials, 6, 6), and element e uses `C[material_ids[e]]`.
+    """
+
+    check_stiffness_quadrature(num_points)
+    _, weights, dN = reference_element(num_points)
+    num_elements = element_nodes.shape[0]
+    K_e = np.empty((num_elements, 24, 24))
+    for start in range(0, num_elements, chunk_size):
+        X = element_nodes[start : start + chunk_size]
+        C_chunk = C if material_ids is None else C[material_ids[start : start + chunk_size]]  # (6, 6) or (chunk, 6, 6)
+
+        # Jacobians, their inverses, and determinants for all elements and Gauss points
+        J = np.swapaxes(X, 1, 2)[:, None] @ dN  # (chunk, num_points, 3, 3)
+        det_J = np.linalg.det(J)
+        dN_phys = dN @ np.linalg.inv(J)  # (chunk, num_points, 8, 3)
+
+        # K_e = sum over Gauss points of B^T C B det(J) w, contracted as one stacked matrix product
+        B = B_operators(dN_phys)  # (chunk, num_points, 6, 24)
+        CB = (np.expand_dims(C_chunk, -3) @ B) * (det_J * weights)[..., None, None]
+        B = B.reshape(X.shape[0], -1, 24)
+        CB = CB.reshape(X.shape[0], -1, 24)
+        K_e[start : start + chunk_size] = np.swapaxes(B, 1, 2) @ CB
+        if num_points == 1 and hourglass_stiffness > 0.0:
+            K_e[start : start + chunk_size] += hourglass_stabilization(X, dN_phys[:, 0], det_J[:, 0] * weights[0], C_chunk, hourglass_stiffness)
+    return K_e
+
+
+@sorbet.log.span("assemble_global_stiffness_matrix")
+def assemble_global_stiffness_matrix(
+    nodes,
+    elements,
+    material_parameters,
+    dense: bool = False,
+    sparsity_pattern=None,
+    reuse_congruent_elements: bool = True,
+    num_workers: int = 1,
+    chunk_size: int = 4096,
+    num_points: int = 8,
+    hourglass_stiffness: float = 0.1,
+):
+    """
+    Assemble the global stiffness matrix as sparse CSR matrix
+
+    The dense path (`dense=True`) is meant for teaching-sized meshes only. A precomputed `sparsity_pattern`
+    (see `sorbet.sparsity.SparsityPattern`) can be passed to skip the symbolic part when assembling repeatedly on the same mesh.
+    With `num_workers > 1`, the element matrices are computed in chunks of `chunk_size` elements by a process pool.
+    `num_points` and `hourglass_stiffness` select the integration scheme, see `element_stiffness_matrices`.
+    """
+
     num_nodes = nodes.shape[0]
     dim = nodes.shape[1]
-    K = np.zeros((dim * num_nodes, dim * num_nodes))
-    for element in elements:
-        K_e = element_stiffness_matrix(nodes[element], material_parameters)
-        for i, node_i in enumerate(element):
-            i_global = dim * node_i
-            for j, node_j in enumerate(element):
-                j_global = dim * node_j
-                K[i_global : i_global + dim, j_global : j_global + dim] += K_e[dim * i : dim * i + dim, dim * j : dim * j + dim]
-    return K
+    sorbet.log.count("elements_assembled", elements.shape[0])
+    quadrature = {"num_points": num_points, "hourglass_stiffness": hourglass_stiffness}
+    if num_workers > 1:
+        K_elements = sorbet.parallel.element_stiffness_matrices(nodes, elements, material_parameters, num_workers, chunk_size, reuse_congruent_elements, **quadrature)
+    else:
+        K_elements = element_stiffness_matrices(nodes[elements], material_parameters, chunk_size, reuse_congruent_elements, **quadrature)
+
+    if dense:
+        K = np.zeros((dim * num_nodes, dim * num_nodes))
+        for element, K_e in zip(elements, K_elements):
+            for i, node_i in enumerate(element):
+                i_global = dim * node_i
+                for j, node_j in enumerate(element):
+                    j_global = dim * node_j
+                    K[i_global : i_global + dim, j_global : j_global + dim] += K_e[dim * i : dim * i + dim, dim * j : dim * j + dim]
+        return K
+
+    if sparsity_pattern is None:
+        sparsity_pattern = sorbet.sparsity.SparsityPattern(elements, num_nodes, dim)
+    data = np.bincount(sparsity_pattern.scatter_positions.ravel(), weights=K_elements.ravel(), minlength=sparsity_pattern.nnz)
+    sorbet.log.count("nnz", sparsity_pattern.nnz)
+    return sparsity_pattern.to_csr(data)
+
+
+class LameDecomposedStiffness:
+    """
+    Global stiffness matrix split into geometry-only parts, K = lambda * K_lambda + mu * K_mu
+
+    The material tangent is linear in the Lamé parameters, hence so is K. Both parts are assembled once on the same
+    sparsity pattern, after which K for any (E, nu) is a linear combination of two data arrays, e.g. for material
+    parameter sweeps of homogeneous materials. All returned matrices share the index arrays of the sparsity pattern. The hourglass
+    stabilization of one-point integration is linear in the material tangent as well.
+    """
+
+    def __init__(
+        self,
+        nodes: NDArray[np.float64],
+        elements: NDArray[np.int64],
+        sparsity_pattern=None,
+        reuse_congruent_elements: bool = True,
+        chunk_size: int = 4096,
+        num_points: int = 8,
+        hourglass_stiffness: float = 0.1,
+    ):
+        if sparsity_pattern is None:
+            sparsity_pattern = sorbet.sparsity.SparsityPattern(elements, nodes.shape[0], nodes.shape[1])
+        self.sparsity_pattern = sparsity_pattern
+
+        element_nodes = nodes[elements]
+        inverse = None
+        if reuse_congruent_elements:
+            representatives, inverse = congruent_element_groups(element_nodes)
+            element_nodes = element_nodes[representatives]
+
+        positions = sparsity_pattern.scatter_positions.ravel()
+        self.data = []
+        for C in lame_material_tangents():
+            K_elements = _integrate_element_matrices(element_nodes, C, chunk_size, num_points, hourglass_stiffness)
+            if inverse is not None:
+                K_elements = K_elements[inverse]
+            self.data.append(np.bincount(positions, weights=K_elements.ravel(), minlength=sparsity_pattern.nnz))
+        self.data_lambda, self.data_mu = self.data
+
+    def stiffness_matrix(self, material_parameters: dict):
+        """Global stiffness matrix for `{"E": ..., "nu": ...}`"""
+
+        if is_heterogeneous(material_parameters):
+            raise NotImplementedError(f"Currently only supporting homogeneous materials. material_parameters = {material_parameters}")
+        lmb, mu = lame_parameters(material_parameters["E"], material_parameters["nu"])
+        return self.sparsity_pattern.to_csr(lmb * self.data_lambda + mu * self.data_mu)
+
+    def stiffness_matrices(self, material_parameters: list[dict]) -> list:
+        """Global stiffness matrices for a list of material parameters, combined in one matrix product"""
+
+        lame = np.array([lame_parameters(parameters["E"], parameters["nu"]) for parameters in material_parameters])
+        data = lame @ np.stack(self.data)  # (num_materials, nnz)
+        return [self.sparsity_pattern.to_csr(row) for row in data]
@@ -1,14 +1,249 @@
+"""
+Logging helpers and a lightweight profiler
+
+`start`/`end` (or `span` as context manager and decorator) mark nested sections. Once profiling is enabled with
+`enable_profiling`, every section records wall time, CPU time, peak RSS of the process up to its end, and optionally
+the tracemalloc peak while it is open. `count` adds to counters of the innermost open section (e.g. elements assembled,
+solver iterations, cache hits). A section left without its `end` (e.g. by an exception) is closed as aborted by the end
+of an enclosing section. `report` returns the aggregated tree, `log_report` and `write_report` emit it.
+When profiling is disabled, sections only log their start and end and `count` returns immediately.
+"""
+
+import functools
+import json
 import logging
+import sys
+import time
+import tracemalloc
 from pathlib import Path
 
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+_profiling = {"enabled": False, "trace_memory": False}
+_stack = []  # open sections, the root section at the bottom
+
+
+class Section:
+    """Aggregated measurements of all calls of one section at one position in the tree"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.aborted = 0  # calls closed by the end of an enclosing section instead of their own end
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_rss_bytes = 0
+        self.peak_traced_bytes = 0
+        self.counters = {}
+        self.children = {}
+
+        # state of the currently open call
+        self._wall_start = 0.0
+        self._cpu_start = 0.0
+        self._traced_peak = 0
+
+    def child(self, name: str) -> "Section":
+        if name not in self.children:
+            self.children[name] = Section(name)
+        return self.children[name]
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "aborted": self.aborted,
+            "wall_time": self.wall_time,
+            "cpu_time": self.cpu_time,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "peak_traced_bytes": self.peak_traced_bytes if _profiling["trace_memory"] else None,
+            "counters": dict(self.counters),
+            "children": [child.to_dict() for child in self.children.values()],
+        }
+
+
+def _peak_rss_bytes() -> int:
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else 1024 * peak  # bytes on macOS, kilobytes on Linux
+
+
+def _open_section(name: str) -> None:
+    parent = _stack[-1]
+    section = parent.child(name)
+    if _profiling["trace_memory"]:
+        # the traced peak is reset per section, so hand the peak so far over to the parent first
+        parent._traced_peak = max(parent._traced_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        section._traced_peak = 0
+    section._wall_start = time.perf_counter()
+    section._cpu_start = time.process_time()
+    _stack.append(section)
+
+
+def _close_section(name: str) -> None:
+    """Close the innermost open section `name`, and all sections opened within it that were not closed (as aborted)"""
+
+    depth = next((depth for depth in range(len(_stack) - 1, 0, -1) if _stack[depth].name == name), None)
+    if depth is None:
+        return  # not opened while profiling was enabled
+    while len(_stack) > depth + 1:
+        section = _stack[-1]
+        logging.warning(f"Section '{section.name}' was not ended before '{name}', closing it as aborted")
+        section.aborted += 1
+        _finish_section()
+    _finish_section()
+
+
+def _finish_section() -> None:
+    section = _stack.pop()
+    section.calls += 1
+    section.wall_time += time.perf_counter() - section._wall_start
+    section.cpu_time += time.process_time() - section._cpu_start
+    section.peak_rss_bytes = max(section.peak_rss_bytes, _peak_rss_bytes())
+    if _profiling["trace_memory"]:
+        traced_peak = max(section._traced_peak, tracemalloc.get_traced_memory()[1])
+        section.peak_traced_bytes = max(section.peak_traced_bytes, traced_peak)
+        _stack[-1]._traced_peak = max(_stack[-1]._traced_peak, traced_peak)
+
+
+def enable_profiling(trace_memory: bool = False) -> None:
+    """Start recording sections and counters (`trace_memory=True` also tracks Python allocations, which is slower)"""
+
+    _stack.clear()
+    root = Section("total")
+    root._wall_start = time.perf_counter()
+    root._cpu_start = time.process_time()
+    _stack.append(root)
+    _profiling.update(enabled=True, trace_memory=trace_memory)
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_profiling() -> None:
+    _profiling["enabled"] = False
+    if _profiling["trace_memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
 
 def start(msg: str) -> None:
     logging.info(f"Starting {msg}...")
+    if _profiling["enabled"]:
+        _open_section(msg)
 
 
 def end(msg: str) -> None:
+    if _profiling["enabled"]:
+        _close_section(msg)
     logging.info(f"Finished {msg}.")
 
 
+class span:
+    """
+    Section usable as context manager (`with sorbet.log.span("solve"):`) or decorator (`@sorbet.log.span("solve")`)
+
+    Unlike `start`/`end`, it does not log and costs only a flag check when profiling is disabled.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        if _profiling["enabled"]:
+            _open_section(self.name)
+        return self
+
+    def __exit__(self, *_):
+        if _profiling["enabled"]:
+            _close_section(self.name)
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _profiling["enabled"]:
+                return function(*args, **kwargs)
+            with self:
+                return function(*args, **kwargs)
+
+        return wrapper
+
+
+def count(name: str, value: int | float = 1) -> None:
+    """Add `value` to a counter of the innermost open section"""
+
+    if not _profiling["enabled"]:
+        return
+    counters = _stack[-1].counters
+    counters[name] = counters.get(name, 0) + value
+
+
+def report() -> dict:
+    """Tree of all sections recorded since `enable_profiling`, the root holds the total time so far"""
+
+    if not _stack:
+        return {}
+    root = _stack[0]
+    root.calls = 1
+    root.wall_time = time.perf_counter() - root._wall_start
+    root.cpu_time = time.process_time() - root._cpu_start
+    root.peak_rss_bytes = _peak_rss_bytes()
+    if _profiling["trace_memory"]:
+        root.peak_traced_bytes = max(root._traced_peak, tracemalloc.get_traced_memory()[1])
+    return root.to_dict()
+
+
+def total_counters(section: dict) -> dict:
+    """Counters summed over a section (see `report`) and all its subsections"""
+
+    totals = dict(section["counters"])
+    for child in section["children"]:
+        for name, value in total_counters(child).items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def log_report() -> None:
+    """Log the section tree with times, memory, and counters"""
+
+    tree = report()
+    if not tree:
+        return
+    total_time = tree["wall_time"] or 1.0
+    lines = ["Profile (wall time, share of total, CPU time, calls, peak RSS):"]
+
+    def add_lines(section: dict, depth: int) -> None:
+        memory = f"{section['peak_rss_bytes'] / 2**20:.0f} MiB"
+        if section["peak_traced_bytes"] is not None:
+            memory += f", traced {section['peak_traced_bytes'] / 2**20:.0f} MiB"
+        counters = ", ".join(f"{name} = {value}" for name, value in section["counters"].items())
+        lines.append(
+            f"{'  ' * depth}{section['name']}: {section['wall_time']:.3f} s ({100.0 * section['wall_time'] / total_time:.1f} %), "
+            f"CPU {section['cpu_time']:.3f} s, {section['calls']}x"
+            + (f" ({section['aborted']} aborted)" if section["aborted"] else "")
+            + f", {memory}"
+            + (f" [{counters}]" if counters else "")
+        )
+        for child in section["children"]:
+            add_lines(child, depth + 1)
+
+    add_lines(tree, 0)
+    totals = ", ".join(f"{name} = {value}" for name, value in total_counters(tree).items())
+    if totals:
+        lines.append(f"Counters: {totals}")
+    logging.info("\n".join(lines))
+
+
+def write_report(file: Path) -> None:
+    """Write the section tree (see `report`) and the counter totals as JSON"""
+
+    tree = report()
+    with open(file, "w") as output:
+        json.dump({"sections": tree, "counters": total_counters(tree) if tree else {}}, output, indent=4)
+    logging.info(f"Wrote profile to {file}")
+
+
 def cwd() -> None:
     logging.info(f"Current working directory: {Path.cwd()}")
@@ -0,0 +1,120 @@
+"""Matrix-free (element-by-element) application of the global stiffness matrix"""
+
+import copy
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse.linalg
+
+import sorbet
+
+
+class MatrixFreeStiffness(scipy.sparse.linalg.LinearOperator):
+    """
+    Linear operator computing K @ u without assembling K
+
+    Element displacements are gathered, multiplied with the element stiffness matrices in batch, and scatter-added.
+    With `cache_element_matrices=True`, the element matrices are computed once and kept in memory (24 x 24 per group
+    of elements congruent up to translation and with the same material), otherwise they are recomputed chunk by chunk in every product, which needs no memory proportional to the mesh size.
+    The operator can be restricted to a subset of DOFs (`free_dofs`), e.g., to solve a constrained system with CG.
+    """
+
+    def __init__(
+        self,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        material_parameters: dict,
+        cache_element_matrices: bool = False,
+        chunk_size: int = 4096,
+        num_points: int = 8,
+        hourglass_stiffness: float = 0.1,
+    ):
+        self.nodes = nodes
+        self.elements = elements
+        self.material_parameters = material_parameters
+        self.chunk_size = chunk_size
+        self.quadrature = {"num_points": num_points, "hourglass_stiffness": hourglass_stiffness}
+        self.num_dof_per_node = nodes.shape[1]
+        self.num_dof = self.num_dof_per_node * nodes.shape[0]
+        self.element_dofs = (self.num_dof_per_node * elements[:, :, None] + np.arange(self.num_dof_per_node)).reshape(elements.shape[0], -1)
+        self.element_matrices = None
+        if cache_element_matrices:
+            # store one matrix per group of congruent elements only
+            element_nodes = nodes[elements]
+            material_ids = None
+            if sorbet.fem.is_heterogeneous(material_parameters):
+                *_, material_ids = sorbet.fem.unique_materials(material_parameters, elements.shape[0])
+            representatives, self.element_groups = sorbet.fem.congruent_element_groups(element_nodes, material_ids=material_ids)
+            representative_materials = sorbet.fem.select_elements(material_parameters, representatives)
+            self.element_matrices = sorbet.fem.element_stiffness_matrices(element_nodes[representatives], representative_materials, chunk_size, **self.quadrature)
+        self.free_dofs = None
+        super().__init__(dtype=np.float64, shape=(self.num_dof, self.num_dof))
+
+    def _element_chunks(self):
+        """Yield element slices together with their stiffness matrices"""
+
+        num_elements = self.elements.shape[0]
+        for start in range(0, num_elements, self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            if self.element_matrices is not None:
+                yield chunk, self.element_matrices[self.element_groups[chunk]]
+            else:
+                yield chunk, sorbet.fem.element_stiffness_matrices(
+                    self.nodes[self.elements[chunk]],
+                    sorbet.fem.select_elements(self.material_parameters, chunk),
+                    self.chunk_size,
+                    **self.quadrature,
+                )
+
+    def _full_matvec(self, u: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        f = np.zeros(self.num_dof)
+        for chunk, K_e in self._element_chunks():
+            element_dofs = self.element_dofs[chunk]
+            f_e = np.einsum("eij,ej->ei", K_e, u[element_dofs])
+            f += np.bincount(element_dofs.ravel(), weights=f_e.ravel(), minlength=self.num_dof)
+        return f
+
+    def _matvec(self, u: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        u = u.ravel()
+        if self.free_dofs is None:
+            return self._full_matvec(u)
+        u_full = np.zeros(self.num_dof)
+        u_full[self.free_dofs] = u
+        return self._full_matvec(u_full)[self.free_dofs]
+
+    def _adjoint(self):
+        return self  # K is symmetric
+
+    def diagonal(self) -> npt.NDArray[np.float64]:
+        """Diagonal of K (restricted to the free DOFs), e.g. for Jacobi preconditioning"""
+
+        diagonal = np.zeros(self.num_dof)
+        for chunk, K_e in self._element_chunks():
+            diagonal += np.bincount(self.element_dofs[chunk].ravel(), weights=np.diagonal(K_e, axis1=1, axis2=2).ravel(), minlength=self.num_dof)
+        return diagonal if self.free_dofs is None else diagonal[self.free_dofs]
+
+    def restrict(self, free_dofs: npt.NDArray[np.int64]) -> "MatrixFreeStiffness":
+        """Operator acting on the given DOFs only, sharing mesh and cached element matrices"""
+
+        restricted = copy.copy(self)
+        restricted.free_dofs = free_dofs
+        restricted.shape = (free_dofs.shape[0], free_dofs.shape[0])
+        return restricted
+
+    def apply_dirichlet_conditions(
+        self,
+        f: npt.NDArray[np.float64],
+        prescribed_dofs: npt.NDArray[np.int64],
+        prescribed_values: npt.NDArray[np.float64],
+    ) -> sorbet.boundary_conditions.ConstrainedSystem:
+        """Eliminate prescribed DOFs, analogous to `sorbet.boundary_conditions.apply_dirichlet_conditions`"""
+
+        is_prescribed = np.zeros(self.num_dof, dtype=bool)
+        is_prescribed[prescribed_dofs] = True
+        free_dofs = np.flatnonzero(~is_prescribed)
+
+        u_prescribed = np.zeros(self.num_dof)
+        u_prescribed[prescribed_dofs] = prescribed_values
+        f_constrained = (f - self._full_matvec(u_prescribed))[free_dofs]
+
+        return sorbet.boundary_conditions.ConstrainedSystem(self.restrict(free_dofs), f_constrained, self.num_dof, free_dofs, prescribed_dofs, prescribed_values)
@@ -1,13 +1,12 @@
 """Wrapper for easy handling of Gmsh's Python API"""
 
-import logging
 from pathlib import Path
 
-import gmsh
 import numpy as np
 from numpy.typing import NDArray
 
 import sorbet
+import sorbet.mesh_cache
 
 
 class GmshManager:
@@ -18,6 +17,8 @@ class GmshManager:
         self.debug_mode = debug_mode
 
     def __enter__(self):
+        import gmsh  # deferred, importing Gmsh is expensive and not needed on a mesh cache hit
+
         gmsh.initialize()
         gmsh.model.add(self.model_name)
         gmsh.option.set_number("General.Terminal", self.debug_mode)
@@ -25,6 +26,8 @@ class GmshManager:
         return self
 
     def __exit__(self, *_):
+        import gmsh
+
         gmsh.finalize()
 
     def create_mesh(
@@ -38,30 +41,32 @@ class GmshManager:
         transfinite_automatic: bool = False,
         mesh_file_name: str = "mesh.msh",
     ) -> None:
-        """Mesh created geometry with sane defaults"""
+        """
+        Mesh created geometry with sane defaults
+
+        The mesh is always generated and the mesh file overwritten. Reusing meshes is handled by `sorbet.mesh_cache`,
+        which takes all parameters into account.
+        """
+
+        import gmsh
 
         output_dir = sorbet.paths.setup()
         self.mesh_file = output_dir / Path(mesh_file_name)
-        if self.mesh_file.exists():
-            logging.info(f"Mesh file with chosen name already exists and is not overwritten: {self.mesh_file}")
-            gmsh.open(self.mesh_file.as_posix())
-
-        else:
-            if mesh_size:
-                gmsh.option.set_number("Mesh.MeshSizeFromPoints", False)
-                gmsh.option.set_number("Mesh.MeshSizeMin", mesh_size)
-                gmsh.option.set_number("Mesh.MeshSizeMax", mesh_size)
-            gmsh.option.set_number("Mesh.RecombineAll", recombine_all)
-            if quasi_structured:
-                gmsh.option.set_number("Mesh.Algorithm", 11)  # quasi-structured
-            gmsh.option.set_number("Mesh.ElementOrder", element_order)
-            gmsh.option.set_number("Mesh.Smoothing", smoothing)
-            if transfinite_automatic:
-                gmsh.model.mesh.set_transfinite_automatic()
-            gmsh.model.mesh.generate(dim=dimension)
-
-            # save mesh
-            gmsh.write(self.mesh_file.as_posix())
+        if mesh_size:
+            gmsh.option.set_number("Mesh.MeshSizeFromPoints", False)
+            gmsh.option.set_number("Mesh.MeshSizeMin", mesh_size)
+            gmsh.option.set_number("Mesh.MeshSizeMax", mesh_size)
+        gmsh.option.set_number("Mesh.RecombineAll", recombine_all)
+        if quasi_structured:
+            gmsh.option.set_number("Mesh.Algorithm", 11)  # quasi-structured
+        gmsh.option.set_number("Mesh.ElementOrder", element_order)
+        gmsh.option.set_number("Mesh.Smoothing", smoothing)
+        if transfinite_automatic:
+            gmsh.model.mesh.set_transfinite_automatic()
+        gmsh.model.mesh.generate(dim=dimension)
+
+        # save mesh
+        gmsh.write(self.mesh_file.as_posix())
 
         # get nodes
         node_tags, node_coords, _ = gmsh.model.mesh.get_nodes()
@@ -69,10 +74,29 @@ class GmshManager:
         self.nodes = node_coords.reshape(-1, 3)
 
         # get elements
-        element_types, _, element_node_tags_list = gmsh.model.mesh.get_elements(dim=dimension)
+        element_types, element_tags_list, element_node_tags_list = gmsh.model.mesh.get_elements(dim=dimension)
         if (element_types.shape[0] != 1) or (element_types[0] != 5):
             raise NotImplementedError(f"Currently only supporting hexahedral elements. Mesh needs to be changed. element_types = {element_types}")
         self.elements = np.int64(element_node_tags_list[0].reshape(-1, 8) - 1)  # for compatibility with PyVista, make sure to use int64 (by default, you get uint64 here)
+        self.element_tags = element_tags_list[0]
+
+    def get_element_physical_groups(self, dimension: int = 3) -> NDArray[np.int64]:
+        """
+        Physical group tag of every element of the created mesh (-1 for elements without physical group)
+
+        Can be turned into per-element material parameters with `sorbet.fem.element_material_parameters`.
+        """
+
+        import gmsh
+
+        element_order = np.argsort(self.element_tags)
+        element_groups = np.full(self.elements.shape[0], -1, dtype=np.int64)
+        for dim, group_tag in gmsh.model.get_physical_groups(dim=dimension):
+            for entity_tag in gmsh.model.get_entities_for_physical_group(dim, group_tag):
+                _, element_tags_list, _ = gmsh.model.mesh.get_elements(dim=dim, tag=entity_tag)
+                for element_tags in element_tags_list:
+                    element_groups[element_order[np.searchsorted(self.element_tags, element_tags, sorter=element_order)]] = group_tag
+        return element_groups
 
     def show_geometry(
         self,
@@ -85,6 +109,8 @@ class GmshManager:
     ) -> None:
         """Open GUI to show created geometry"""
 
+        import gmsh
+
         gmsh.option.set_number("Geometry.Points", points)
         gmsh.option.set_number("Geometry.Lines", lines)
         gmsh.option.set_number("Geometry.Surfaces", surfaces)
@@ -101,6 +127,8 @@ class GmshManager:
     ) -> None:
         """Open GUI to show created mesh"""
 
+        import gmsh
+
         gmsh.open(self.mesh_file.as_posix())
         gmsh.option.set_number("Geometry.Points", False)
         gmsh.option.set_number("Geometry.Lines", False)
@@ -111,6 +139,7 @@ class GmshManager:
         gmsh.fltk.run()
 
 
+@sorbet.mesh_cache.cached
 def create_cube(
     geometry_width: float = 1.0,
     geometry_height: float = 1.0,
@@ -120,6 +149,8 @@ def create_cube(
     show_geometry: bool = False,
     show_mesh: bool = False,
 ) -> tuple[NDArray[np.float64], NDArray[np.uint64]]:
+    import gmsh
+
     section = "create_cube"
     sorbet.log.start(section)
     with GmshManager() as gm:
@@ -139,6 +170,7 @@ def create_cube(
     return gm.nodes, gm.elements
 
 
+@sorbet.mesh_cache.cached
 def create_notched_specimen(
     geometry_width: float = 8.0,
     geometry_height: float = 3.0,
@@ -148,6 +180,8 @@ def create_notched_specimen(
     show_geometry: bool = False,
     show_mesh: bool = False,
 ) -> tuple[NDArray[np.float64], NDArray[np.uint64]]:
+    import gmsh
+
     section = "create_notched_specimen"
     sorbet.log.start(section)
     with GmshManager() as gm:
@@ -169,3 +203,29 @@ def create_notched_specimen(
             gm.show_mesh()
     sorbet.log.end(section)
     return gm.nodes, gm.elements
+
+
+def create_structured_box(
+    geometry_width: float = 1.0,
+    geometry_height: float = 1.0,
+    geometry_thickness: float = 1.0,
+    num_elements_width: int = 5,
+    num_elements_height: int = 5,
+    num_elements_thickness: int = 5,
+) -> tuple[NDArray[np.float64], NDArray[np.int64]]:
+    """
+    Structured hexahedral mesh of a box, created with NumPy only (no Gmsh, e.g. for benchmarks and headless runs)
+
+    Nodes are numbered with z fastest, elements follow Gmsh's node ordering of hexahedra.
+    """
+
+    x = np.linspace(0.0, geometry_width, num_elements_width + 1)
+    y = np.linspace(0.0, geometry_height, num_elements_height + 1)
+    z = np.linspace(0.0, geometry_thickness, num_elements_thickness + 1)
+    nodes = np.stack(np.meshgrid(x, y, z, indexing="ij"), axis=-1).reshape(-1, 3)
+
+    node_ids = np.arange(nodes.shape[0]).reshape(x.shape[0], y.shape[0], z.shape[0])
+    i, j, k = (index.ravel() for index in np.meshgrid(np.arange(num_elements_width), np.arange(num_elements_height), np.arange(num_elements_thickness), indexing="ij"))
+    corners = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1)]
+    elements = np.stack([node_ids[i + di, j + dj, k + dk] for di, dj, dk in corners], axis=1).astype(np.int64)
+    return nodes, elements
@@ -0,0 +1,181 @@
+"""Content-addressed cache for meshes, so that Gmsh is skipped entirely on a cache hit"""
+
+import functools
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from numpy.typing import NDArray
+
+import sorbet
+
+CACHE_FORMAT_VERSION = 1
+ARGUMENTS_NOT_AFFECTING_MESH = ("show_geometry", "show_mesh")
+MAX_CACHE_SIZE_BYTES = 2 * 2**30  # limits applied by `evict` after every store
+MAX_ENTRY_AGE_SECONDS = 30 * 24 * 3600.0
+
+
+def cache_dir() -> Path:
+    """Directory holding one subdirectory per cached mesh"""
+
+    return sorbet.paths.setup() / Path("mesh_cache")
+
+
+@functools.cache
+def gmsh_version() -> str:
+    """Installed Gmsh version, read from the package metadata so that Gmsh is not imported on a cache hit"""
+
+    try:
+        return importlib.metadata.version("gmsh")
+    except importlib.metadata.PackageNotFoundError:
+        return "not installed"
+
+
+def _source(obj) -> str:
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):  # e.g. defined interactively
+        return obj.__code__.co_code.hex() if hasattr(obj, "__code__") else ""
+
+
+def cache_key(function, arguments: dict) -> str:
+    """
+    Hash of the geometry function (name and source code), the source of its module, the Gmsh version, and the arguments
+
+    Including the source code of the whole module (e.g. `sorbet.mesh` with `GmshManager`) makes sure that changes of
+    the geometry, of the mesh options, or of defaults used by the mesh generation invalidate previously cached
+    meshes, and so does an upgrade of Gmsh.
+    """
+
+    payload = {
+        "version": CACHE_FORMAT_VERSION,
+        "function": f"{function.__module__}.{function.__qualname__}",
+        "source": _source(function),
+        "module_source": _source(inspect.getmodule(function)),
+        "gmsh_version": gmsh_version(),
+        "arguments": arguments,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+def load(key: str, mmap_mode: str | None = None) -> tuple[NDArray[np.float64], NDArray[np.int64]] | None:
+    """Load cached nodes and elements (memory-mapped with `mmap_mode`) or return None on a cache miss"""
+
+    entry_dir = cache_dir() / Path(key)
+    if not (entry_dir / Path("elements.npy")).exists():
+        return None
+    entry_dir.touch()  # modification time of the entry is used as last access time for eviction
+    nodes = np.load(entry_dir / Path("nodes.npy"), mmap_mode=mmap_mode)
+    elements = np.load(entry_dir / Path("elements.npy"), mmap_mode=mmap_mode)
+    return nodes, elements
+
+
+def store(key: str, nodes: NDArray[np.float64], elements: NDArray[np.int64], metadata: dict | None = None) -> None:
+    """
+    Store nodes and elements as .npy files
+
+    The files are written to a unique staging directory, which is renamed to the entry atomically, so entries are
+    never partial and concurrent processes storing the same key do not interfere. If another process stored the
+    entry first, it is kept and the staging directory is discarded. Afterwards, old entries are evicted (see
+    `MAX_CACHE_SIZE_BYTES` and `MAX_ENTRY_AGE_SECONDS`).
+    """
+
+    entry_dir = cache_dir() / Path(key)
+    cache_dir().mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f"{key}.", suffix=".tmp", dir=cache_dir()))
+    try:
+        np.save(tmp_dir / Path("nodes.npy"), nodes)
+        np.save(tmp_dir / Path("elements.npy"), elements)
+        with open(tmp_dir / Path("metadata.json"), "w") as file:
+            json.dump(metadata or {}, file, indent=4, default=repr)
+        os.rename(tmp_dir, entry_dir)  # fails if the entry exists (POSIX: non-empty target, Windows: any target)
+    except OSError:
+        if not (entry_dir / Path("elements.npy")).exists():
+            raise
+        logging.info(f"Mesh cache entry {key} was stored concurrently, keeping it")
+    finally:
+        if tmp_dir.exists():
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    evict(MAX_CACHE_SIZE_BYTES, MAX_ENTRY_AGE_SECONDS, keep=key)
+
+
+def _entry_size(entry_dir: Path) -> int:
+    return sum(file.stat().st_size for file in entry_dir.iterdir())
+
+
+def evict(max_size_bytes: int | None = None, max_age_seconds: float | None = None, keep: str | None = None) -> None:
+    """
+    Remove entries not used for more than `max_age_seconds`, then least recently used entries until the cache fits
+    into `max_size_bytes`, except for the entry `keep` (e.g. the one just stored, which still counts towards the size)
+    """
+
+    if not cache_dir().exists():
+        return
+    entries = []
+    total_size = 0
+    for entry_dir in cache_dir().iterdir():
+        if entry_dir.suffix == ".tmp":  # skip entries being written
+            continue
+        try:
+            size = _entry_size(entry_dir)
+            last_used = entry_dir.stat().st_mtime
+        except (FileNotFoundError, NotADirectoryError):  # evicted concurrently, or not an entry
+            continue
+        total_size += size
+        if entry_dir.name != keep:
+            entries.append((last_used, size, entry_dir))
+    entries.sort()  # least recently used first
+
+    now = time.time()
+    for last_used, size, entry_dir in entries:
+        too_old = max_age_seconds is not None and now - last_used > max_age_seconds
+        too_large = max_size_bytes is not None and total_size > max_size_bytes
+        if too_old or too_large:
+            shutil.rmtree(entry_dir, ignore_errors=True)  # another process may evict it at the same time
+            total_size -= size
+            logging.info(f"Evicted mesh cache entry: {entry_dir.name}")
+
+
+def cached(function):
+    """
+    Decorator for functions returning `(nodes, elements)` created with Gmsh
+
+    On a hit, the arrays are loaded without calling the function (and Gmsh) at all. They are ordinary writable
+    arrays, like the ones returned on a miss, so callers behave the same regardless of the state of the cache.
+    The cache is bypassed with `use_cache=False` or when the geometry or mesh GUI is requested.
+    """
+
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, use_cache: bool = True, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        if not use_cache or any(arguments.get(name) for name in ARGUMENTS_NOT_AFFECTING_MESH):
+            return function(*args, **kwargs)
+
+        for name in ARGUMENTS_NOT_AFFECTING_MESH:
+            arguments.pop(name, None)
+        key = cache_key(function, arguments)
+        cached_mesh = load(key)
+        if cached_mesh is not None:
+            logging.info(f"Loaded mesh from cache: {function.__name__}({arguments}) -> {key}")
+            sorbet.log.count("mesh_cache_hits")
+            return cached_mesh
+
+        sorbet.log.count("mesh_cache_misses")
+        nodes, elements = function(*args, **kwargs)
+        store(key, nodes, elements, metadata={"function": function.__name__, "arguments": arguments})
+        logging.info(f"Stored mesh in cache: {function.__name__}({arguments}) -> {key}")
+        return nodes, elements
+
+    return wrapper
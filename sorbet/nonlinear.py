@@ -0,0 +1,334 @@
+"""
+Large deformations: total Lagrangian hyperelasticity solved with incremental-iterative Newton-Raphson
+
+All quantities refer to the reference configuration: the deformation gradient F = I + grad_X u, the Green-Lagrange
+strain E = (F^T F - I) / 2, and the second Piola-Kirchhoff stress S. Voigt notation is the one of
+`sorbet.fem.B_operators` (xx, yy, zz, xy, xz, yz with engineering shear strains).
+"""
+
+import logging
+import time
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse
+
+import sorbet
+
+# tensor indices (I, J) of the six Voigt components
+VOIGT_ROWS = np.array([0, 1, 2, 0, 0, 1])
+VOIGT_COLUMNS = np.array([0, 1, 2, 1, 2, 2])
+# Voigt component of every tensor index pair
+VOIGT_MAP = np.array([[0, 3, 4], [3, 1, 5], [4, 5, 2]])
+
+
+def green_lagrange_strains(F: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Green-Lagrange strains in Voigt notation (..., 6) for deformation gradients (..., 3, 3)"""
+
+    E = 0.5 * (np.swapaxes(F, -1, -2) @ F - np.eye(3))
+    return E[..., VOIGT_ROWS, VOIGT_COLUMNS] * np.array([1.0, 1.0, 1.0, 2.0, 2.0, 2.0])
+
+
+def saint_venant_kirchhoff(
+    F: npt.NDArray[np.float64],
+    lmb: npt.NDArray[np.float64],
+    mu: npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Second Piola-Kirchhoff stresses (..., 6) and material tangents (..., 6, 6) of the Saint Venant-Kirchhoff material
+
+    S = lambda tr(E) I + 2 mu E, i.e. Hooke's law in terms of E, so the tangent is the linear elastic one.
+    `lmb` and `mu` broadcast against the leading dimensions of F.
+    """
+
+    C_lambda, C_mu = sorbet.fem.lame_material_tangents()
+    D = np.asarray(lmb)[..., None, None] * C_lambda + np.asarray(mu)[..., None, None] * C_mu
+    D = np.broadcast_to(D, F.shape[:-2] + (6, 6))
+    S = (D @ green_lagrange_strains(F)[..., None])[..., 0]
+    return S, D
+
+
+def neo_hookean(
+    F: npt.NDArray[np.float64],
+    lmb: npt.NDArray[np.float64],
+    mu: npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """
+    Second Piola-Kirchhoff stresses (..., 6) and material tangents (..., 6, 6) of the compressible Neo-Hookean material
+
+    Strain energy W = mu / 2 (tr(C) - 3) - mu ln(J) + lambda / 2 ln(J)^2 with C = F^T F and J = det(F), hence
+    S = mu (I - C^-1) + lambda ln(J) C^-1. Inverted elements (J <= 0) give NaN.
+    """
+
+    lmb = np.asarray(lmb)[..., None, None]
+    mu = np.asarray(mu)[..., None, None]
+    det_F = np.linalg.det(F)
+    inverted = ~(det_F > 0.0)  # also NaN
+    F = np.where(inverted[..., None, None], np.eye(3), F)  # C = F^T F is singular for J = 0
+    C_inv = np.linalg.inv(np.swapaxes(F, -1, -2) @ F)
+    C_inv[inverted] = np.nan
+    log_J = np.log(np.where(inverted, 1.0, det_F))[..., None, None]
+    S = mu * (np.eye(3) - C_inv) + lmb * log_J * C_inv
+
+    # D_IJKL = lambda C^-1_IJ C^-1_KL + (mu - lambda ln(J)) (C^-1_IK C^-1_JL + C^-1_IL C^-1_JK)
+    rows, cols = VOIGT_ROWS, VOIGT_COLUMNS
+    C_inv_voigt = C_inv[..., rows, cols]
+    D = lmb * C_inv_voigt[..., :, None] * C_inv_voigt[..., None, :] + (mu - lmb * log_J) * (
+        C_inv[..., rows[:, None], rows[None, :]] * C_inv[..., cols[:, None], cols[None, :]]
+        + C_inv[..., rows[:, None], cols[None, :]] * C_inv[..., cols[:, None], rows[None, :]]
+    )
+    return S[..., rows, cols], D
+
+
+def material_response(
+    material: str,
+    F: npt.NDArray[np.float64],
+    lmb: npt.NDArray[np.float64],
+    mu: npt.NDArray[np.float64],
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+    """Stresses and tangents of a hyperelastic material by name ("saint_venant_kirchhoff", "neo_hookean")"""
+
+    match material:
+        case "saint_venant_kirchhoff":
+            return saint_venant_kirchhoff(F, lmb, mu)
+        case "neo_hookean":
+            return neo_hookean(F, lmb, mu)
+        case _:
+            raise NotImplementedError(f"Currently only supporting saint_venant_kirchhoff/neo_hookean materials. material = {material}")
+
+
+def nonlinear_B_operators(F: npt.NDArray[np.float64], dN_phys: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """
+    Strain-displacement matrices dE = B dU in the current state, shape (..., 6, 24)
+
+    Row (I, J) holds F_iI dN_a/dX_J + F_iJ dN_a/dX_I for the DOF (a, i), halved on the diagonal. For F = I, this is
+    `sorbet.fem.B_operators`.
+    """
+
+    rows, cols = VOIGT_ROWS, VOIGT_COLUMNS
+    B = np.einsum("...ir,...ar->...rai", F[..., :, rows], dN_phys[..., :, cols]) + np.einsum("...ir,...ar->...rai", F[..., :, cols], dN_phys[..., :, rows])
+    B[..., :3, :, :] *= 0.5
+    return B.reshape(B.shape[:-3] + (6, 24))
+
+
+class TotalLagrangianProblem:
+    """
+    Internal forces and tangent stiffness of a hyperelastic body in total Lagrangian formulation
+
+    Everything that does not depend on the displacements is set up once: the shape function derivatives with respect
+    to the reference coordinates and the volume weights at all Gauss points, the sparsity pattern with its scatter
+    positions, and the buffer for the element matrices. Every Newton iteration then costs one batched pass over the
+    elements (see `assemble`), which scatters into the data array of the fixed pattern.
+    `E` and `nu` in `material_parameters` are either scalars or arrays with one value per element.
+    """
+
+    def __init__(
+        self,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        material_parameters: dict,
+        material: str = "saint_venant_kirchhoff",
+        num_points: int = 8,
+        chunk_size: int = 4096,
+        sparsity_pattern=None,
+    ):
+        if num_points == 1:
+            raise NotImplementedError(f"Currently only supporting 4/8 Gauss points for large deformations, one point needs hourglass control. num_points = {num_points}")
+        sorbet.fem.check_stiffness_quadrature(num_points)
+        material_response(material, np.eye(3), 1.0, 1.0)  # fail early for unknown materials
+
+        self.nodes = nodes
+        self.elements = elements
+        self.material = material
+        self.chunk_size = chunk_size
+        num_elements = elements.shape[0]
+        self.num_dof = 3 * nodes.shape[0]
+        self.element_dofs = (3 * elements[:, :, None] + np.arange(3)).reshape(num_elements, 24)
+
+        E = np.broadcast_to(np.asarray(material_parameters["E"], dtype=np.float64), (num_elements,))
+        nu = np.broadcast_to(np.asarray(material_parameters["nu"], dtype=np.float64), (num_elements,))
+        self.lmb, self.mu = sorbet.fem.lame_parameters(E, nu)
+
+        # reference configuration: dN/dX and det(J) * weight at all Gauss points
+        _, weights, dN = sorbet.fem.reference_element(num_points)
+        J = np.swapaxes(nodes[elements], 1, 2)[:, None] @ dN  # (num_elements, num_points, 3, 3)
+        self.dN_phys = dN @ np.linalg.inv(J)  # (num_elements, num_points, 8, 3)
+        self.volume_weights = np.linalg.det(J) * weights  # (num_elements, num_points)
+
+        if sparsity_pattern is None:
+            sparsity_pattern = sorbet.sparsity.SparsityPattern(elements, nodes.shape[0], 3)
+        self.sparsity_pattern = sparsity_pattern
+        self.scatter_positions = sparsity_pattern.scatter_positions.ravel()
+        self.element_matrices = None  # allocated on the first tangent assembly and reused
+
+    @sorbet.log.span("nonlinear_assembly")
+    def assemble(self, u: npt.NDArray[np.float64], tangent: bool = True) -> tuple[npt.NDArray[np.float64], scipy.sparse.csr_matrix | None]:
+        """
+        Internal force vector and (with `tangent=True`) tangent stiffness matrix for the displacements u
+
+        Both come from the same pass over the elements: f_int = sum B^T S dV and K = sum B^T D B dV + K_geometric,
+        where the geometric part couples nodes a and b with dN_a^T S dN_b dV in every direction.
+        """
+
+        num_elements = self.elements.shape[0]
+        u_elements = u.reshape(-1, 3)[self.elements]  # (num_elements, 8, 3)
+        f_elements = np.empty((num_elements, 24))
+        if tangent and self.element_matrices is None:
+            self.element_matrices = np.empty((num_elements, 24, 24))
+        for start in range(0, num_elements, self.chunk_size):
+            chunk = slice(start, start + self.chunk_size)
+            dN_phys = self.dN_phys[chunk]
+            dV = self.volume_weights[chunk]
+            num_chunk = dN_phys.shape[0]
+
+            F = np.eye(3) + np.swapaxes(u_elements[chunk], 1, 2)[:, None] @ dN_phys  # (chunk, num_points, 3, 3)
+            S, D = material_response(self.material, F, self.lmb[chunk, None], self.mu[chunk, None])
+            B = nonlinear_B_operators(F, dN_phys)  # (chunk, num_points, 6, 24)
+            f_elements[chunk] = np.einsum("cprk,cpr->ck", B, S * dV[..., None])
+            if not tangent:
+                continue
+
+            DB = (D @ B) * dV[..., None, None]
+            K_e = np.swapaxes(B.reshape(num_chunk, -1, 24), 1, 2) @ DB.reshape(num_chunk, -1, 24)
+            G = np.einsum("cpaI,cpIJ,cpbJ->cab", dN_phys, S[..., VOIGT_MAP] * dV[..., None, None], dN_phys)  # (chunk, 8, 8)
+            K_e = K_e.reshape(num_chunk, 8, 3, 8, 3)
+            for i in range(3):
+                K_e[:, :, i, :, i] += G
+            self.element_matrices[chunk] = K_e.reshape(num_chunk, 24, 24)
+
+        sorbet.log.count("elements_assembled", num_elements)
+        f_int = np.bincount(self.element_dofs.ravel(), weights=f_elements.ravel(), minlength=self.num_dof)
+        if not tangent:
+            return f_int, None
+        data = np.bincount(self.scatter_positions, weights=self.element_matrices.ravel(), minlength=self.sparsity_pattern.nnz)
+        return f_int, self.sparsity_pattern.to_csr(data)
+
+    def internal_forces(self, u: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        return self.assemble(u, tangent=False)[0]
+
+
+def newton_raphson(
+    problem: TotalLagrangianProblem,
+    node_sets: list[tuple[npt.NDArray[np.int64], int, float | npt.NDArray[np.float64]]],
+    f_ext: npt.NDArray[np.float64] | None = None,
+    num_steps: int = 10,
+    load_factors: npt.ArrayLike | None = None,
+    tangent_update_interval: int = 1,
+    line_search: bool = True,
+    max_line_search_steps: int = 8,
+    rtol: float = 1e-8,
+    max_iterations: int = 25,
+) -> tuple[npt.NDArray[np.float64], dict]:
+    """
+    Incremental-iterative solution of a total Lagrangian problem under prescribed displacements and dead loads
+
+    `node_sets` are the prescribed displacements as for `sorbet.boundary_conditions.collect_prescribed_dofs`, e.g.
+    the `bcs` of `main.py`, and `f_ext` are nodal forces. Both are scaled with the load factors, `num_steps` equal
+    increments up to 1 by default. Within a step, the first iteration applies the prescribed increment through the
+    linearized system, and the step has converged when the residual norm of the free DOFs is below `rtol` times the
+    norm of the external and internal forces (the latter includes the reactions).
+
+    With `tangent_update_interval = k > 1` (modified Newton), the tangent is assembled and factorized only in every
+    k-th iteration of a step and otherwise only the internal forces are assembled. It is also refreshed early when
+    the residual grew with a stale tangent. With `line_search=True`, the Newton update is halved up to
+    `max_line_search_steps` times until the residual norm decreases (or, while the prescribed increment is being
+    applied, until no element is inverted).
+
+    Returns the displacements and a dict with "converged", "load_factors", "displacements" (one row per converged
+    step), and "steps", which holds the residual norm, step length, and times for assembly, factorization,
+    solution, and line search of every iteration.
+    """
+
+    if load_factors is None:
+        load_factors = np.arange(1, num_steps + 1) / num_steps
+    load_factors = np.asarray(load_factors, dtype=np.float64)
+    prescribed_dofs, prescribed_values = sorbet.boundary_conditions.collect_prescribed_dofs(node_sets)
+    if f_ext is None:
+        f_ext = np.zeros(problem.num_dof)
+    is_free = np.ones(problem.num_dof, dtype=bool)
+    is_free[prescribed_dofs] = False
+
+    u = np.zeros(problem.num_dof)
+    f_int, _ = problem.assemble(u, tangent=False)
+    solver = None
+    steps = []
+    displacements = []
+    converged = True
+    for step_index, load_factor in enumerate(load_factors):
+        f_step = load_factor * f_ext
+        u_prescribed = load_factor * prescribed_values
+        iterations = []
+        step_converged = False
+        stale_tangent = False
+        with sorbet.log.span("load_step"):
+            for iteration in range(max_iterations):
+                timing = {}
+                iteration_start = time.perf_counter()
+                refresh = solver is None or iteration % tangent_update_interval == 0 or stale_tangent
+                if refresh:
+                    f_int, K = problem.assemble(u)
+                    timing["assembly_time"] = time.perf_counter() - iteration_start
+                    solver = sorbet.solvers.FactorizedSolver(K, prescribed_dofs)
+                    timing["factorization_time"] = time.perf_counter() - iteration_start - timing["assembly_time"]
+                    sorbet.log.count("tangent_updates")
+                else:
+                    timing["assembly_time"] = timing["factorization_time"] = 0.0
+
+                solve_start = time.perf_counter()
+                residual = f_step - f_int
+                residual_norm = np.linalg.norm(residual[is_free])
+                du = solver.solve(np.where(is_free, residual, 0.0), u_prescribed - u[prescribed_dofs])
+                timing["solve_time"] = time.perf_counter() - solve_start
+
+                # line search on the residual norm, trial states only need the internal forces
+                line_search_start = time.perf_counter()
+                applies_increment = not np.allclose(u[prescribed_dofs], u_prescribed)
+                step_length = 1.0
+                for line_search_step in range(max_line_search_steps + 1):
+                    f_int_trial = problem.internal_forces(u + step_length * du)
+                    trial_norm = np.linalg.norm((f_step - f_int_trial)[is_free])
+                    if not line_search or (np.isfinite(trial_norm) and (applies_increment or trial_norm < residual_norm)):
+                        break
+                    if line_search_step < max_line_search_steps:
+                        step_length *= 0.5
+                sorbet.log.count("line_search_steps", line_search_step)
+                timing["line_search_time"] = time.perf_counter() - line_search_start
+                if not np.isfinite(trial_norm):
+                    logging.warning(f"Load step {step_index + 1}: elements are inverted at step length {step_length}")
+                    break
+
+                stale_tangent = not refresh and trial_norm > residual_norm
+                u += step_length * du
+                f_int = f_int_trial
+                sorbet.log.count("newton_iterations")
+
+                tolerance = rtol * max(np.linalg.norm(f_step), np.linalg.norm(f_int))
+                step_converged = trial_norm <= tolerance and np.allclose(u[prescribed_dofs], u_prescribed)
+                timing["total_time"] = time.perf_counter() - iteration_start
+                iterations.append({"residual_norm": trial_norm, "step_length": step_length, "tangent_updated": refresh, **timing})
+                logging.info(
+                    f"Load step {step_index + 1}/{load_factors.shape[0]}, iteration {iteration + 1}: residual norm = {trial_norm:.3e}, "
+                    f"step length = {step_length}, assembly {timing['assembly_time']:.3f} s, factorization {timing['factorization_time']:.3f} s, "
+                    f"solve {timing['solve_time']:.3f} s, line search {timing['line_search_time']:.3f} s"
+                )
+                if step_converged:
+                    break
+
+        steps.append({"load_factor": load_factor, "converged": step_converged, "iterations": iterations})
+        if not step_converged:
+            logging.warning(f"Newton-Raphson did not converge in load step {step_index + 1} (load factor {load_factor})")
+            converged = False
+            break
+        displacements.append(u.copy())
+        logging.info(
+            f"Load step {step_index + 1}/{load_factors.shape[0]} (load factor {load_factor:.3g}) converged after {len(iterations)} iterations "
+            f"in {sum(iteration['total_time'] for iteration in iterations):.3f} s"
+        )
+
+    info = {
+        "converged": converged,
+        "load_factors": load_factors[: len(displacements)],
+        "displacements": np.array(displacements).reshape(-1, problem.num_dof),
+        "steps": steps,
+    }
+    return u, info
@@ -0,0 +1,117 @@
+"""Multi-core computation of element matrices using a process pool and shared memory"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+
+import sorbet
+
+# arrays shared with the worker processes, set by `_initialize_worker`
+_worker_arrays = {}
+_worker_shared_memory = []
+
+
+def _create_shared_array(shape: tuple, dtype: np.dtype) -> tuple[shared_memory.SharedMemory, npt.NDArray]:
+    """Allocate a NumPy array in a new shared memory block"""
+
+    dtype = np.dtype(dtype)
+    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def split_material_parameters(material_parameters: dict) -> tuple[dict, list[tuple[str, npt.NDArray[np.float64]]]]:
+    """Scalar material parameters, and per-element ones as `(material_<name>, array)` to be put into shared memory"""
+
+    scalars = {name: value for name, value in material_parameters.items() if np.ndim(value) == 0}
+    arrays = [(f"material_{name}", np.asarray(value, dtype=np.float64)) for name, value in material_parameters.items() if np.ndim(value) > 0]
+    return scalars, arrays
+
+
+def _initialize_worker(array_specs: dict, scalar_material_parameters: dict, quadrature: dict) -> None:
+    """Attach to the shared arrays once per worker process, per-element material parameters are shared as `material_<name>`"""
+
+    material_parameters = dict(scalar_material_parameters)
+    for name, (shm_name, shape, dtype) in array_specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shared_memory.append(shm)  # keep the block alive as long as the worker
+        _worker_arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        if name.startswith("material_"):
+            material_parameters[name.removeprefix("material_")] = _worker_arrays[name]
+    _worker_arrays["material_parameters"] = material_parameters
+    _worker_arrays["quadrature"] = quadrature
+
+
+def _compute_chunk(bounds: tuple[int, int]) -> None:
+    """Compute the element matrices of one chunk and write them into the shared value buffer"""
+
+    start, stop = bounds
+    nodes = _worker_arrays["nodes"]
+    elements = _worker_arrays["elements"]
+    element_ids = _worker_arrays["element_ids"]
+    _worker_arrays["values"][start:stop] = sorbet.fem.element_stiffness_matrices(
+        nodes[elements[element_ids[start:stop]]],
+        sorbet.fem.select_elements(_worker_arrays["material_parameters"], element_ids[start:stop]),
+        chunk_size=stop - start,
+        **_worker_arrays["quadrature"],
+    )
+
+
+def element_stiffness_matrices(
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    material_parameters: dict,
+    num_workers: int | None = None,
+    chunk_size: int = 4096,
+    reuse_congruent_elements: bool = False,
+    num_points: int = 8,
+    hourglass_stiffness: float = 0.1,
+) -> npt.NDArray[np.float64]:
+    """
+    Parallel counterpart of `sorbet.fem.element_stiffness_matrices`, splitting the elements into chunks
+
+    `nodes`, `elements`, per-element material parameters, and the result buffer live in shared memory, so only chunk
+    bounds (and scalar material parameters once per worker) are sent to the workers.
+    Every element matrix is computed by the same kernel as in the serial path, hence the results match exactly.
+    Congruent elements are grouped in the main process, so that only one matrix per group is computed.
+    """
+
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    element_ids = np.arange(elements.shape[0])
+    if reuse_congruent_elements:
+        material_ids = None
+        if sorbet.fem.is_heterogeneous(material_parameters):
+            *_, material_ids = sorbet.fem.unique_materials(material_parameters, elements.shape[0])
+        element_ids, inverse = sorbet.fem.congruent_element_groups(nodes[elements], material_ids=material_ids)
+    num_matrices = element_ids.shape[0]
+    quadrature = {"num_points": num_points, "hourglass_stiffness": hourglass_stiffness}
+    num_dof_per_element = nodes.shape[1] * elements.shape[1]
+
+    shared_blocks = []
+    shared_arrays = {}
+    try:
+        # per-element material parameters are shared like the mesh, only scalars are sent to the workers
+        scalar_material_parameters, material_arrays = split_material_parameters(material_parameters)
+        for name, array in [("nodes", nodes), ("elements", elements), ("element_ids", element_ids)] + material_arrays:
+            shm, shared_arrays[name] = _create_shared_array(array.shape, array.dtype)
+            shared_arrays[name][...] = array
+            shared_blocks.append(shm)
+        shm, shared_arrays["values"] = _create_shared_array((num_matrices, num_dof_per_element, num_dof_per_element), np.float64)
+        shared_blocks.append(shm)
+        array_specs = {name: (shm.name, array.shape, array.dtype) for shm, (name, array) in zip(shared_blocks, shared_arrays.items())}
+
+        chunks = [(start, min(start + chunk_size, num_matrices)) for start in range(0, num_matrices, chunk_size)]
+        with ProcessPoolExecutor(max_workers=num_workers, initializer=_initialize_worker, initargs=(array_specs, scalar_material_parameters, quadrature)) as pool:
+            list(pool.map(_compute_chunk, chunks))
+        values = shared_arrays["values"][inverse] if reuse_congruent_elements else shared_arrays["values"].copy()
+
+    finally:
+        shared_arrays.clear()  # release the buffers before closing the shared memory
+        for shm in shared_blocks:
+            shm.close()
+            shm.unlink()
+
+    return values
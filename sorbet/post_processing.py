@@ -5,7 +5,9 @@ from pathlib import Path
 
 import numpy as np
 import numpy.typing as npt
-import pyvista as pv
+import scipy.sparse
+
+import sorbet
 
 
 def get_connectivity(elements: npt.NDArray[np.int64], num_nodes_per_element: np.int64) -> npt.NDArray[np.int64]:
@@ -35,18 +37,31 @@ def get_cell_type_array(num_elements: int, cell_type: str = "HEXAHEDRON") -> npt
     return 12 * np.ones(num_elements, dtype=np.int64)
 
 
-def get_mesh(num_elements: np.int64, num_nodes_per_element: np.int64, nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64]):
-    """"""
+def get_mesh(
+    num_elements: np.int64,
+    num_nodes_per_element: np.int64,
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    point_data: dict[str, npt.NDArray[np.float64]] | None = None,
+):
+    """Create PyVista grid, optionally with nodal fields attached (e.g. from `recover_stresses`)"""
+
+    import pyvista as pv  # deferred, importing PyVista/VTK is expensive and not needed in headless runs
 
     connectivity = get_connectivity(elements, num_nodes_per_element)
     cell_types = get_cell_type_array(num_elements)
 
-    return pv.UnstructuredGrid(connectivity, cell_types, nodes)
+    mesh = pv.UnstructuredGrid(connectivity, cell_types, nodes)
+    for name, values in (point_data or {}).items():
+        mesh.point_data[name] = values
+    return mesh
 
 
 def plot_mesh(num_elements: np.int64, num_nodes_per_element: np.int64, nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64]) -> None:
     """"""
 
+    import pyvista as pv
+
     mesh = get_mesh(num_elements, num_nodes_per_element, nodes, elements)
     p = pv.Plotter()
     p.add_mesh(mesh, show_edges=True)
@@ -56,12 +71,11 @@ def plot_mesh(num_elements: np.int64, num_nodes_per_element: np.int64, nodes: np
 def plot_deformed_mesh(num_elements: np.int64, num_nodes_per_element: np.int64, nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64], displacement: npt.NDArray[np.float64]) -> None:
     """"""
 
-    original_mesh = get_mesh(num_elements, num_nodes_per_element, nodes, elements)
+    import pyvista as pv
 
-    connectivity = get_connectivity(elements, num_nodes_per_element)
-    cell_types = get_cell_type_array(num_elements)
-    deformed_nodes = np.copy(nodes) + displacement
-    deformed_mesh = pv.UnstructuredGrid(connectivity, cell_types, deformed_nodes)
+    original_mesh = get_mesh(num_elements, num_nodes_per_element, nodes, elements)
+    deformed_mesh = original_mesh.copy(deep=False)  # shares connectivity and cell types with the original mesh
+    deformed_mesh.SetPoints(pv.vtk_points(nodes + displacement))  # new points, setting `points` would move the shared ones
 
     p = pv.Plotter()
     p.add_mesh(original_mesh, color="white", opacity=0.5)
@@ -86,8 +100,10 @@ def color_plot_nodal_values(
     Options for cmap: https://matplotlib.org/stable/users/explain/colors/colormaps.html
     """
 
+    import pyvista as pv
+
     if deformed:
-        nodes += displacement
+        nodes = nodes + displacement  # no in-place update of the caller's nodes
 
     mesh = get_mesh(num_elements, num_nodes_per_element, nodes, elements)
     mesh[nodal_values_name] = nodal_values
@@ -97,6 +113,215 @@ def color_plot_nodal_values(
     p.show()
 
 
+class BatchRenderer:
+    """
+    Off-screen rendering of many fields and load steps on one mesh, e.g. for reports without a display
+
+    The PyVista grid and the plotter are created once. For every image or animation frame, only the point
+    coordinates (deformed configuration) and the scalars of the grid are updated in place.
+    Images and animations are written to the output directory.
+    """
+
+    def __init__(
+        self,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        window_size: tuple[int, int] = (1024, 768),
+        cmap: str = "jet",
+        show_edges: bool = False,
+        camera_position: str = "iso",
+    ):
+        import pyvista as pv
+
+        self.nodes = nodes
+        self.grid = get_mesh(elements.shape[0], elements.shape[1], np.array(nodes), elements)  # own copy, the grid shares memory with its points
+        self.grid.point_data["values"] = np.zeros(nodes.shape[0])
+        self.plotter = pv.Plotter(off_screen=True, window_size=window_size)
+        self.actor = self.plotter.add_mesh(self.grid, scalars="values", cmap=cmap, show_edges=show_edges, show_scalar_bar=False)
+        self.plotter.camera_position = camera_position
+        self.output_dir = sorbet.paths.setup()
+
+    def update(
+        self,
+        displacement: npt.NDArray[np.float64] | None = None,
+        nodal_values: npt.NDArray[np.float64] | None = None,
+        name: str = "",
+        scale: float = 1.0,
+        clim: tuple[float, float] | None = None,
+    ) -> None:
+        """Update coordinates (undeformed if no displacement is given) and scalars (magnitude for vector fields)"""
+
+        points = self.nodes if displacement is None else self.nodes + scale * displacement
+        self.grid.points[:] = points
+        if nodal_values is not None:
+            if nodal_values.ndim > 1:
+                nodal_values = np.linalg.norm(nodal_values.reshape(nodal_values.shape[0], -1), axis=1)
+            self.grid.point_data["values"][:] = nodal_values
+            self.actor.mapper.scalar_range = clim if clim is not None else (nodal_values.min(), nodal_values.max())
+            if len(self.plotter.scalar_bars) > 0:
+                self.plotter.remove_scalar_bar()
+            self.plotter.add_scalar_bar(title=name, mapper=self.actor.mapper)
+        self.grid.Modified()
+
+    def screenshot(self, file_name: str, **update_kwargs) -> Path:
+        """Update the grid (see `update`) and save an image"""
+
+        self.update(**update_kwargs)
+        file = self.output_dir / Path(file_name)
+        self.plotter.render()
+        self.plotter.screenshot(file)
+        return file
+
+    def animate(self, file_name: str, frames: list[dict], fps: int = 10) -> Path:
+        """Write an animation (.gif or a movie format, requires imageio) with one frame per dict of `update` arguments"""
+
+        file = self.output_dir / Path(file_name)
+        if file.suffix == ".gif":
+            self.plotter.open_gif(file.as_posix(), fps=fps)
+        else:
+            self.plotter.open_movie(file.as_posix(), framerate=fps)
+        for frame in frames:
+            self.update(**frame)
+            self.plotter.write_frame()
+        self.plotter.mwriter.close()
+        return file
+
+    def render_results(self, reader, field_names: list[str], displacement_name: str | None = "displacement", scale: float = 1.0) -> list[Path]:
+        """Save one image per load step and field of a `sorbet.results.ResultReader`"""
+
+        files = []
+        for step in range(reader.num_steps):
+            displacement = reader.read_field(displacement_name, step) if displacement_name else None
+            for name in field_names:
+                nodal_values = reader.read_field(name, step)
+                files.append(self.screenshot(f"{name}_step_{step}.png", displacement=displacement, nodal_values=nodal_values, name=name, scale=scale))
+        logging.info(f"Rendered {len(files)} images to {self.output_dir}")
+        return files
+
+    def close(self) -> None:
+        self.plotter.close()
+
+
+def gauss_point_strains(
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    displacement: npt.NDArray[np.float64],
+    num_points: int = 8,
+    chunk_size: int = 4096,
+) -> npt.NDArray[np.float64]:
+    """
+    Strains at all Gauss points of all elements, shape (num_elements, num_points, 6)
+
+    Voigt notation as in `sorbet.fem.B_operators`: xx, yy, zz, xy, xz, yz with engineering shear strains.
+    """
+
+    _, _, dN = sorbet.fem.reference_element(num_points)
+    num_elements = elements.shape[0]
+    strains = np.empty((num_elements, num_points, 6))
+    for start in range(0, num_elements, chunk_size):
+        element_nodes = elements[start : start + chunk_size]
+        X = nodes[element_nodes]
+        J = np.swapaxes(X, 1, 2)[:, None] @ dN  # (chunk, num_points, 3, 3)
+        B = sorbet.fem.B_operators(dN @ np.linalg.inv(J))  # (chunk, num_points, 6, 24)
+        u_e = displacement[element_nodes].reshape(-1, 1, 24, 1)
+        strains[start : start + chunk_size] = (B @ u_e)[..., 0]
+    return strains
+
+
+def gauss_point_stresses(strains: npt.NDArray[np.float64], material_parameters: dict) -> npt.NDArray[np.float64]:
+    """Stresses from Gauss point strains (see `gauss_point_strains`) for homogeneous or per-element material parameters"""
+
+    if not sorbet.fem.is_heterogeneous(material_parameters):
+        C = sorbet.fem.linear_elastic_material_tangent(E=float(material_parameters["E"]), nu=float(material_parameters["nu"]))
+        return strains @ C  # C is symmetric
+    E, nu, material_ids = sorbet.fem.unique_materials(material_parameters, strains.shape[0])
+    C = sorbet.fem.linear_elastic_material_tangents(E, nu)
+    stresses = np.empty(strains.shape)
+    for material_id in range(C.shape[0]):
+        in_material = material_ids == material_id
+        stresses[in_material] = strains[in_material] @ C[material_id]
+    return stresses
+
+
+def von_mises_stress(stresses: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Von Mises equivalent stress for stresses in Voigt notation (..., 6)"""
+
+    s_xx, s_yy, s_zz, s_xy, s_xz, s_yz = np.moveaxis(stresses, -1, 0)
+    return np.sqrt(0.5 * ((s_xx - s_yy) ** 2 + (s_yy - s_zz) ** 2 + (s_zz - s_xx) ** 2) + 3.0 * (s_xy**2 + s_xz**2 + s_yz**2))
+
+
+def extrapolation_matrix(num_points: int = 8) -> npt.NDArray[np.float64]:
+    """
+    Matrix mapping values at the Gauss points to the element nodes, shape (8, num_points)
+
+    The trilinear field through the Gauss point values is evaluated at the nodes (least squares fit for fewer than
+    8 points, e.g. constant for one point).
+    """
+
+    points, _ = sorbet.fem.gauss_quadrature(num_points)
+    return np.linalg.pinv(sorbet.fem.linear_shape_functions_batched(points))
+
+
+def nodal_averaging_matrix(elements: npt.NDArray[np.int64], num_nodes: int) -> scipy.sparse.csr_matrix:
+    """
+    Element-to-node incidence, scaled to average over all elements sharing a node, shape (num_nodes, num_elements * 8)
+
+    Multiplying it with element nodal values, reshaped to (num_elements * 8, ...), gives the averaged nodal values.
+    """
+
+    element_nodes = elements.ravel()
+    num_elements_per_node = np.bincount(element_nodes, minlength=num_nodes)
+    weights = 1.0 / num_elements_per_node[element_nodes]
+    return scipy.sparse.csr_matrix((weights, (element_nodes, np.arange(element_nodes.shape[0]))), shape=(num_nodes, element_nodes.shape[0]))
+
+
+def extrapolate_to_nodes(
+    gauss_point_values: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    num_nodes: int,
+    averaging_matrix: scipy.sparse.csr_matrix | None = None,
+) -> npt.NDArray[np.float64]:
+    """
+    Extrapolate values at Gauss points (num_elements, num_points, ...) to the element nodes and average them at the nodes
+
+    Pass a precomputed `averaging_matrix` (see `nodal_averaging_matrix`) when extrapolating several fields on the same mesh.
+    """
+
+    if averaging_matrix is None:
+        averaging_matrix = nodal_averaging_matrix(elements, num_nodes)
+    num_elements, num_points = gauss_point_values.shape[:2]
+    element_nodal_values = np.einsum("ap,ep...->ea...", extrapolation_matrix(num_points), gauss_point_values)
+    nodal_values = averaging_matrix @ element_nodal_values.reshape(num_elements * elements.shape[1], -1)
+    return nodal_values.reshape((num_nodes,) + gauss_point_values.shape[2:])
+
+
+def recover_stresses(
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    displacement: npt.NDArray[np.float64],
+    material_parameters: dict,
+    num_points: int = 8,
+) -> dict[str, npt.NDArray[np.float64]]:
+    """
+    Strain, stress, and von Mises stress at the nodes, extrapolated from the Gauss points and averaged
+
+    The returned fields can be attached to the PyVista grid with `get_mesh(..., point_data=fields)`.
+    """
+
+    section = "recover_stresses"
+    sorbet.log.start(section)
+    strains = gauss_point_strains(nodes, elements, displacement, num_points)
+    stresses = gauss_point_stresses(strains, material_parameters)
+    averaging_matrix = nodal_averaging_matrix(elements, nodes.shape[0])
+    fields = {
+        "strain": extrapolate_to_nodes(strains, elements, nodes.shape[0], averaging_matrix),
+        "stress": extrapolate_to_nodes(stresses, elements, nodes.shape[0], averaging_matrix),
+        "von_mises": extrapolate_to_nodes(von_mises_stress(stresses), elements, nodes.shape[0], averaging_matrix),
+    }
+    sorbet.log.end(section)
+    return fields
+
+
 def create_output_dir(dir_name: str = "output") -> Path:
     """"""
 
@@ -108,13 +333,22 @@ def create_output_dir(dir_name: str = "output") -> Path:
     return output_dir
 
 
-def save_nodal_values(nodal_values: npt.NDArray[np.float64], file_name: str) -> None:
-    """"""
+def save_nodal_values(nodal_values: npt.NDArray[np.float64], file_name: str, renumbering=None, text: bool = False) -> None:
+    """
+    Save nodal values as .npy file (and as text file with `text=True`, which is slow for large meshes)
+
+    Values are mapped back to the original node numbering if a `sorbet.renumbering.Renumbering` is given.
+    To store mesh and several fields and load steps together, see `sorbet.results.ResultWriter`.
+    """
+
+    if renumbering is not None:
+        nodal_values = renumbering.to_original(nodal_values)
 
     output_dir = create_output_dir()
 
-    nodal_values_txt = output_dir / Path(f"{file_name}.txt")
-    np.savetxt(nodal_values_txt, nodal_values, delimiter=" ")
+    if text:
+        nodal_values_txt = output_dir / Path(f"{file_name}.txt")
+        np.savetxt(nodal_values_txt, nodal_values, delimiter=" ")
 
     nodal_values_npy = output_dir / Path(f"{file_name}.npy")
     np.save(nodal_values_npy, nodal_values)
@@ -0,0 +1,118 @@
+"""Node renumbering to reduce bandwidth and fill-in of the global system of equations"""
+
+import logging
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse
+import scipy.sparse.csgraph
+
+import sorbet
+
+
+class Renumbering:
+    """Node permutation with `permutation[new] = old` and `inverse[old] = new`"""
+
+    def __init__(self, permutation: npt.NDArray[np.int64]):
+        self.permutation = permutation
+        self.inverse = np.empty_like(permutation)
+        self.inverse[permutation] = np.arange(permutation.shape[0])
+        self.report = {}
+
+    def apply(self, nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64]) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+        """Renumber nodes and the element connectivity"""
+
+        return nodes[self.permutation], self.inverse[elements]
+
+    def to_original(self, nodal_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """Map nodal values (one row per node) from the new back to the original numbering"""
+
+        return nodal_values[self.inverse]
+
+
+def node_graph(elements: npt.NDArray[np.int64], num_nodes: int) -> scipy.sparse.csr_matrix:
+    """Adjacency of nodes sharing an element"""
+
+    pattern = sorbet.sparsity.SparsityPattern(elements, num_nodes, num_dof_per_node=1)
+    return pattern.to_csr()
+
+
+def reverse_cuthill_mckee(nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64]) -> Renumbering:
+    """Reverse Cuthill-McKee ordering of the node graph (bandwidth and profile reduction)"""
+
+    graph = node_graph(elements, nodes.shape[0])
+    return Renumbering(scipy.sparse.csgraph.reverse_cuthill_mckee(graph, symmetric_mode=True).astype(np.int64))
+
+
+def nested_dissection(nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64], leaf_size: int = 64) -> Renumbering:
+    """
+    Geometric nested dissection (fill reduction for direct solvers)
+
+    Elements are split recursively at the median of their centroids along the longest extent. Nodes shared by
+    both halves form the separator, which is numbered after both halves. Subdomains with at most `leaf_size`
+    elements are numbered in their original order.
+    """
+
+    num_nodes = nodes.shape[0]
+    centroids = nodes[elements].mean(axis=1)
+    numbered = np.zeros(num_nodes, dtype=bool)
+    order = []
+
+    def dissect(element_ids: npt.NDArray[np.int64]) -> None:
+        if element_ids.shape[0] <= leaf_size:
+            leaf_nodes = np.unique(elements[element_ids])
+            leaf_nodes = leaf_nodes[~numbered[leaf_nodes]]
+            numbered[leaf_nodes] = True
+            order.append(leaf_nodes)
+            return
+
+        subdomain_centroids = centroids[element_ids]
+        axis = np.argmax(np.ptp(subdomain_centroids, axis=0))
+        sorted_ids = element_ids[np.argsort(subdomain_centroids[:, axis], kind="stable")]
+        half = sorted_ids.shape[0] // 2
+        left, right = sorted_ids[:half], sorted_ids[half:]
+
+        # reserve the separator before numbering the halves, number it last
+        separator = np.intersect1d(elements[left], elements[right])
+        separator = separator[~numbered[separator]]
+        numbered[separator] = True
+        dissect(left)
+        dissect(right)
+        order.append(separator)
+
+    dissect(np.arange(elements.shape[0]))
+    order.append(np.flatnonzero(~numbered))  # nodes without elements
+    return Renumbering(np.concatenate(order))
+
+
+def renumber_mesh(
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    method: str = "rcm",
+    exact_factor_nnz: bool = False,
+) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64], Renumbering]:
+    """
+    Renumber nodes after meshing and report bandwidth, profile, and factor fill before and after
+
+    Options for method: "rcm" (reverse Cuthill-McKee) or "nested_dissection".
+    Pass the returned `Renumbering` to `sorbet.post_processing.save_nodal_values` to save results in the original numbering.
+    """
+
+    section = f"renumbering ({method})"
+    sorbet.log.start(section)
+    match method:
+        case "rcm":
+            renumbering = reverse_cuthill_mckee(nodes, elements)
+        case "nested_dissection":
+            renumbering = nested_dissection(nodes, elements)
+        case _:
+            raise NotImplementedError(f"Currently only supporting rcm/nested_dissection renumbering. method = {method}")
+
+    new_nodes, new_elements = renumbering.apply(nodes, elements)
+    before = sorbet.sparsity.SparsityPattern(elements, nodes.shape[0]).report(exact_factor_nnz)
+    after = sorbet.sparsity.SparsityPattern(new_elements, nodes.shape[0]).report(exact_factor_nnz)
+    renumbering.report = {"method": method, "before": before, "after": after}
+    for key in ("bandwidth", "profile", "factor_nnz"):
+        logging.info(f"Renumbering {key}: {before[key]} -> {after[key]} ({after[key] / before[key]:.2f}x)")
+    sorbet.log.end(section)
+    return new_nodes, new_elements, renumbering
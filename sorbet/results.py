@@ -0,0 +1,206 @@
+"""
+Binary result files: mesh and fields of several load steps in one XDMF file with a raw binary data file
+
+The heavy data of all arrays is appended to `<name>.bin`, `<name>.xdmf` describes the mesh, the load steps, and
+where every array is stored. The XDMF file is rewritten after every step, so results can be inspected
+(e.g. in ParaView) while a simulation is still running. Uncompressed arrays are read back memory-mapped.
+
+Fields with six components in Voigt notation (xx, yy, zz, xy, xz, yz as in `sorbet.fem.B_operators`) are stored in the
+component order of XDMF's Tensor6 (xx, xy, xz, yy, yz, zz), with tensor instead of engineering shear strains, so that
+readers like ParaView get the right components. `ResultReader` converts them back.
+"""
+
+import logging
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+
+import numpy as np
+import numpy.typing as npt
+
+import sorbet
+
+XDMF_NUMBER_TYPES = {"f": "Float", "i": "Int", "u": "UInt"}
+XDMF_ATTRIBUTE_TYPES = {1: "Scalar", 3: "Vector", 6: "Tensor6", 9: "Tensor"}
+
+# Voigt components in the order of Tensor6, the inverse permutation, and the shear components of Tensor6
+TENSOR6_FROM_VOIGT = np.array([0, 3, 4, 1, 5, 2])
+VOIGT_FROM_TENSOR6 = np.argsort(TENSOR6_FROM_VOIGT)
+TENSOR6_SHEAR = np.array([1, 2, 4])
+
+
+class ResultWriter:
+    """
+    Write the mesh once and append nodal and cell fields step by step
+
+    With `compression=True`, every array is compressed with zlib (marked with `Compression="Zlib"` in the XDMF file).
+    This saves disk space, but such arrays cannot be memory-mapped and not every XDMF reader supports them.
+    """
+
+    def __init__(
+        self,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        file_name: str = "results",
+        compression: bool = False,
+        output_dir: Path | None = None,
+    ):
+        if output_dir is None:
+            output_dir = sorbet.paths.setup()
+        self.xdmf_file = output_dir / Path(f"{file_name}.xdmf")
+        self.data_file = output_dir / Path(f"{file_name}.bin")
+        self.compression = compression
+        self.num_nodes = nodes.shape[0]
+        self.num_elements = elements.shape[0]
+        self.steps = []
+
+        self._data = open(self.data_file, "wb")
+        self.nodes = self._append(nodes)
+        self.elements = self._append(elements)
+        self._write_xdmf()
+        logging.info(f"Writing results to {self.xdmf_file}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self) -> None:
+        self._data.close()
+
+    def _append(self, array: npt.NDArray) -> dict:
+        """Append an array to the binary data file and return where it is stored"""
+
+        array = np.ascontiguousarray(array)
+        array = array.astype(array.dtype.newbyteorder("<"), copy=False)
+        data = array.tobytes()
+        if self.compression:
+            data = zlib.compress(data)
+        item = {"offset": self._data.tell(), "num_bytes": len(data), "shape": array.shape, "dtype": array.dtype.str, "compressed": self.compression}
+        self._data.write(data)
+        self._data.flush()
+        return item
+
+    def write_step(
+        self,
+        time: float = 0.0,
+        point_data: dict[str, npt.NDArray] | None = None,
+        cell_data: dict[str, npt.NDArray] | None = None,
+        engineering_strains: tuple[str, ...] = ("strain",),
+    ) -> None:
+        """
+        Append the nodal fields (one row per node) and cell fields (one row per element) of one load step
+
+        Fields with six components are taken as Voigt notation and written as Tensor6, the shear components of
+        the fields named in `engineering_strains` are halved.
+        """
+
+        fields = []
+        for center, data, num_rows in (("Node", point_data, self.num_nodes), ("Cell", cell_data, self.num_elements)):
+            for name, values in (data or {}).items():
+                if values.shape[0] != num_rows:
+                    raise ValueError(f"Field {name} needs one row per {center.lower()}. values.shape = {values.shape}")
+                layout = None
+                if values.ndim == 2 and values.shape[1] == 6:
+                    values = values[:, TENSOR6_FROM_VOIGT]
+                    layout = "voigt"
+                    if name in engineering_strains:
+                        values[:, TENSOR6_SHEAR] *= 0.5
+                        layout = "voigt_engineering_strain"
+                fields.append((name, center, self._append(values), layout))
+        self.steps.append({"time": time, "fields": fields})
+        self._write_xdmf()
+
+    def _data_item(self, parent: ET.Element, item: dict) -> ET.Element:
+        dtype = np.dtype(item["dtype"])
+        attributes = {
+            "Dimensions": " ".join(str(size) for size in item["shape"]),
+            "NumberType": XDMF_NUMBER_TYPES[dtype.kind],
+            "Precision": str(dtype.itemsize),
+            "Format": "Binary",
+            "Endian": "Little",
+            "Seek": str(item["offset"]),
+        }
+        if item["compressed"]:
+            attributes.update(Compression="Zlib", CompressedSize=str(item["num_bytes"]))
+        data_item = ET.SubElement(parent, "DataItem", attributes)
+        data_item.text = self.data_file.name
+        return data_item
+
+    def _write_xdmf(self) -> None:
+        xdmf = ET.Element("Xdmf", Version="3.0")
+        collection = ET.SubElement(ET.SubElement(xdmf, "Domain"), "Grid", Name="results", GridType="Collection", CollectionType="Temporal")
+        for step_index, step in enumerate(self.steps or [{"time": 0.0, "fields": []}]):
+            grid = ET.SubElement(collection, "Grid", Name=f"step_{step_index}", GridType="Uniform")
+            ET.SubElement(grid, "Time", Value=repr(float(step["time"])))
+            # every step refers to the same mesh data, which is stored only once
+            self._data_item(ET.SubElement(grid, "Topology", TopologyType="Hexahedron", NumberOfElements=str(self.num_elements)), self.elements)
+            self._data_item(ET.SubElement(grid, "Geometry", GeometryType="XYZ"), self.nodes)
+            for name, center, item, layout in step["fields"]:
+                num_components = int(np.prod(item["shape"][1:]))
+                attribute_type = XDMF_ATTRIBUTE_TYPES.get(num_components, "Matrix")
+                attribute = ET.SubElement(grid, "Attribute", Name=name, AttributeType=attribute_type, Center=center)
+                if layout is not None:
+                    ET.SubElement(attribute, "Information", Name="sorbet_layout", Value=layout)  # how to convert back
+                self._data_item(attribute, item)
+        ET.indent(xdmf)
+        tmp_file = self.xdmf_file.with_suffix(".xdmf.tmp")
+        ET.ElementTree(xdmf).write(tmp_file, xml_declaration=True, encoding="utf-8")
+        tmp_file.replace(self.xdmf_file)  # readers never see a partially written file
+
+
+class ResultReader:
+    """Read results written by `ResultWriter`, uncompressed arrays are memory-mapped"""
+
+    def __init__(self, file_name: str = "results", output_dir: Path | None = None):
+        if output_dir is None:
+            output_dir = sorbet.paths.setup()
+        self.xdmf_file = output_dir / Path(f"{file_name}.xdmf")
+        grids = ET.parse(self.xdmf_file).getroot().findall("./Domain/Grid/Grid")
+        self.data_file = self.xdmf_file.parent / Path(grids[0].find("./Geometry/DataItem").text.strip())
+        self._nodes = grids[0].find("./Geometry/DataItem")
+        self._elements = grids[0].find("./Topology/DataItem")
+        self.times = [float(grid.find("Time").get("Value")) for grid in grids]
+        self._fields = [{attribute.get("Name"): attribute for attribute in grid.findall("Attribute")} for grid in grids]
+
+    @property
+    def num_steps(self) -> int:
+        return len(self.times)
+
+    def field_names(self, step: int = -1) -> list[str]:
+        return list(self._fields[step])
+
+    def _read(self, data_item: ET.Element, mmap_mode: str | None) -> npt.NDArray:
+        shape = tuple(int(size) for size in data_item.get("Dimensions").split())
+        kind = {number_type: kind for kind, number_type in XDMF_NUMBER_TYPES.items()}[data_item.get("NumberType")]
+        dtype = np.dtype(f"<{kind}{data_item.get('Precision')}")
+        offset = int(data_item.get("Seek"))
+        if data_item.get("Compression") == "Zlib":
+            with open(self.data_file, "rb") as file:
+                file.seek(offset)
+                data = zlib.decompress(file.read(int(data_item.get("CompressedSize"))))
+            return np.frombuffer(data, dtype=dtype).reshape(shape)
+        if mmap_mode is None:
+            with open(self.data_file, "rb") as file:
+                file.seek(offset)
+                return np.fromfile(file, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+        return np.memmap(self.data_file, dtype=dtype, mode=mmap_mode, offset=offset, shape=shape)
+
+    def read_mesh(self, mmap_mode: str | None = "r") -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64]]:
+        """Nodes and elements"""
+
+        return self._read(self._nodes, mmap_mode), self._read(self._elements, mmap_mode)
+
+    def read_field(self, name: str, step: int = -1, mmap_mode: str | None = "r") -> npt.NDArray:
+        """Values of a field in a load step (the last one by default), Voigt fields are converted back (as a copy)"""
+
+        attribute = self._fields[step][name]
+        values = self._read(attribute.find("DataItem"), mmap_mode)
+        layout = attribute.find("./Information[@Name='sorbet_layout']")
+        if layout is None:
+            return values
+        if layout.get("Value") == "voigt_engineering_strain":
+            values = np.array(values)
+            values[:, TENSOR6_SHEAR] *= 2.0
+        return np.asarray(values[:, VOIGT_FROM_TENSOR6])
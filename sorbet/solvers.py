@@ -0,0 +1,407 @@
+"""Iterative and direct solvers for the global system of equations"""
+
+import hashlib
+import json
+import logging
+from typing import Callable
+
+import numpy as np
+import numpy.typing as npt
+import scipy.sparse
+import scipy.sparse.linalg
+
+import sorbet
+
+
+def jacobi_preconditioner(K: scipy.sparse.csr_matrix) -> scipy.sparse.linalg.LinearOperator:
+    """Diagonal scaling with the inverse of diag(K)"""
+
+    inverse_diagonal = 1.0 / K.diagonal()
+    return scipy.sparse.linalg.LinearOperator(K.shape, matvec=lambda r: inverse_diagonal * r.ravel())
+
+
+def block_jacobi_preconditioner(K: scipy.sparse.csr_matrix, dofs: npt.NDArray[np.int64] | None = None, num_dof_per_node: int = 3) -> scipy.sparse.linalg.LinearOperator:
+    """
+    Scaling with the inverses of the nodal diagonal blocks of K
+
+    `dofs` holds the global DOF index of every row of K, e.g. `free_dofs` of a constrained system.
+    By default, K is assumed to contain all DOFs.
+    """
+
+    if dofs is None:
+        dofs = np.arange(K.shape[0])
+    node_ids, row_block = np.unique(dofs // num_dof_per_node, return_inverse=True)
+    row_component = dofs % num_dof_per_node
+
+    # nodal blocks, padded with the identity where DOFs were removed
+    blocks = np.tile(np.eye(num_dof_per_node), (node_ids.shape[0], 1, 1))
+    K_coo = K.tocoo()
+    same_block = row_block[K_coo.row] == row_block[K_coo.col]
+    rows, cols = K_coo.row[same_block], K_coo.col[same_block]
+    blocks[row_block[rows], row_component[rows], row_component[cols]] = K_coo.data[same_block]
+    inverse_blocks = np.linalg.inv(blocks)
+
+    def matvec(r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        r_blocks = np.zeros((node_ids.shape[0], num_dof_per_node))
+        r_blocks[row_block, row_component] = r.ravel()
+        z_blocks = np.einsum("nij,nj->ni", inverse_blocks, r_blocks)
+        return z_blocks[row_block, row_component]
+
+    return scipy.sparse.linalg.LinearOperator(K.shape, matvec=matvec)
+
+
+def incomplete_cholesky_preconditioner(K: scipy.sparse.csr_matrix, num_sweeps: int = 3) -> scipy.sparse.linalg.LinearOperator:
+    """
+    Incomplete Cholesky factorization without fill-in, IC(0), applied as two triangular solves
+
+    The factor is computed with the fine-grained fixed-point iteration of Chow and Patel (2015), where each sweep
+    updates all nonzeros of L at once from L @ L.T, on the symmetrically scaled matrix with unit diagonal.
+    """
+
+    scaling = 1.0 / np.sqrt(K.diagonal())
+    A = scipy.sparse.tril(scipy.sparse.diags(scaling) @ K @ scipy.sparse.diags(scaling)).tocsr()
+    A.sort_indices()
+    rows = np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))
+    cols = A.indices
+    is_diagonal = rows == cols
+
+    L = A.copy()  # initial guess: lower triangle of A
+    for _ in range(num_sweeps):
+        L_diagonal = L.diagonal()
+        LLT = np.asarray((L @ L.T)[rows, cols]).ravel()
+        partial_sums = LLT - L.data * L_diagonal[cols]  # sum over k < j of L_ik * L_jk
+        data = (A.data - partial_sums) / L_diagonal[cols]
+        data[is_diagonal] = np.sqrt(np.maximum(A.data[is_diagonal] - partial_sums[is_diagonal], 1e-12))
+        L.data = data
+    LT = L.T.tocsr()
+
+    def matvec(r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        y = scipy.sparse.linalg.spsolve_triangular(L, scaling * r.ravel(), lower=True)
+        return scaling * scipy.sparse.linalg.spsolve_triangular(LT, y, lower=False)
+
+    return scipy.sparse.linalg.LinearOperator(K.shape, matvec=matvec)
+
+
+def aggregate_nodes(node_graph: scipy.sparse.csr_matrix) -> npt.NDArray[np.int64]:
+    """
+    Aggregation of graph nodes: every root of a maximal distance-2 independent set with all its neighbors
+
+    The roots are selected in rounds of Luby's algorithm on the squared graph, all nodes at once: an undecided node
+    becomes a root if its random weight is the largest of the undecided nodes within distance 2, and the nodes within
+    distance 2 of a new root are excluded. The remaining nodes join the aggregate of a neighbor.
+    """
+
+    num_nodes = node_graph.shape[0]
+    graph = (scipy.sparse.csr_matrix(node_graph, dtype=bool) + scipy.sparse.eye(num_nodes, dtype=bool, format="csr")).tocsr()
+
+    def neighbor_max(values: npt.NDArray) -> npt.NDArray:
+        return np.maximum.reduceat(values[graph.indices], graph.indptr[:-1])  # rows are not empty (diagonal)
+
+    weights = np.random.default_rng(0).permutation(num_nodes)  # distinct, reproducible
+    undecided = np.ones(num_nodes, dtype=bool)
+    is_root = np.zeros(num_nodes, dtype=bool)
+    while np.any(undecided):
+        new_roots = undecided & (neighbor_max(neighbor_max(np.where(undecided, weights, -1))) == weights)
+        is_root |= new_roots
+        undecided &= neighbor_max(neighbor_max(new_roots)) == 0
+
+    # roots are at distance >= 3 from each other, and every other node is within distance 2 of a root
+    root_aggregates = np.full(num_nodes, -1, dtype=np.int64)
+    root_aggregates[is_root] = np.arange(np.count_nonzero(is_root))
+    aggregates = neighbor_max(root_aggregates)
+    unassigned = aggregates < 0
+    aggregates[unassigned] = neighbor_max(aggregates)[unassigned]
+    return aggregates
+
+
+def amg_preconditioner(
+    K: scipy.sparse.csr_matrix,
+    dofs: npt.NDArray[np.int64] | None = None,
+    nodes: npt.NDArray[np.float64] | None = None,
+    num_dof_per_node: int = 3,
+    num_smoothing_steps: int = 2,
+    smoothing_weight: float = 1.0,
+) -> scipy.sparse.linalg.LinearOperator:
+    """
+    Two-level smoothed aggregation preconditioner (AMG-style V-cycle with a direct coarse solve)
+
+    Nodes are aggregated on the nodal graph of K (see `aggregate_nodes`). The tentative prolongation maps every
+    aggregate to the rigid body modes on it, orthonormalized per aggregate: the three translations, and with the
+    coordinates of all `nodes` (indexed by `dofs // num_dof_per_node`) also the three rotations, which makes the
+    coarse space capture bending. Damped Jacobi is used for prolongation smoothing and as symmetric smoother.
+    """
+
+    if dofs is None:
+        dofs = np.arange(K.shape[0])
+    node_ids, row_node = np.unique(dofs // num_dof_per_node, return_inverse=True)
+    row_component = dofs % num_dof_per_node
+
+    # nodal graph of K and aggregation
+    K_coo = K.tocoo()
+    node_graph = scipy.sparse.csr_matrix(
+        (np.ones(K_coo.nnz), (row_node[K_coo.row], row_node[K_coo.col])),
+        shape=(node_ids.shape[0], node_ids.shape[0]),
+    )
+    aggregates = aggregate_nodes(node_graph)
+    num_aggregates = aggregates.max() + 1
+
+    # near-nullspace B of every row: translations, and rotations about the centroid of the aggregate (scaled to its size)
+    num_rows = K.shape[0]
+    row_aggregate = aggregates[row_node]
+    if nodes is not None and num_dof_per_node == 3:
+        counts = np.bincount(aggregates, minlength=num_aggregates)[:, None]
+        coordinates = nodes[node_ids]
+        centroids = np.stack([np.bincount(aggregates, coordinates[:, axis], minlength=num_aggregates) for axis in range(3)], axis=1) / counts
+        coordinates = coordinates - centroids[aggregates]
+        radii = np.sqrt(np.bincount(aggregates, np.sum(coordinates**2, axis=1), minlength=num_aggregates) / counts[:, 0])
+        coordinates /= np.where(radii > 0.0, radii, 1.0)[aggregates, None]
+        B = sorbet.fem.rigid_body_modes(coordinates)[row_node, row_component]
+    else:
+        B = np.eye(num_dof_per_node)[row_component]
+    num_modes = B.shape[1]
+
+    # tentative prolongation: orthonormal basis of B on every aggregate, B V diag(lambda)^-1/2 from the eigenpairs of B^T B
+    aggregation = scipy.sparse.csr_matrix((np.ones(num_rows), (row_aggregate, np.arange(num_rows))), shape=(num_aggregates, num_rows))
+    gram = (aggregation @ (B[:, :, None] * B[:, None, :]).reshape(num_rows, -1)).reshape(num_aggregates, num_modes, num_modes)
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    independent = eigenvalues > 1e-10 * eigenvalues[:, -1:]  # e.g. rotations of a single node, or components without free DOFs
+    basis = eigenvectors * np.where(independent, 1.0 / np.sqrt(np.where(independent, eigenvalues, 1.0)), 0.0)[:, None, :]
+    P_tentative = scipy.sparse.csr_matrix(
+        (
+            np.einsum("rm,rmk->rk", B, basis[row_aggregate]).ravel(),
+            (np.repeat(np.arange(num_rows), num_modes), (num_modes * row_aggregate[:, None] + np.arange(num_modes)).ravel()),
+        ),
+        shape=(num_rows, num_modes * num_aggregates),
+    )
+    P_tentative.eliminate_zeros()
+
+    # Jacobi smoothing of the tentative prolongation
+    inverse_diagonal = 1.0 / K.diagonal()
+    D_inv_K = scipy.sparse.diags(inverse_diagonal) @ K
+    D_inv_sqrt = scipy.sparse.diags(np.sqrt(inverse_diagonal))
+    spectral_radius = scipy.sparse.linalg.eigsh(D_inv_sqrt @ K @ D_inv_sqrt, k=1, which="LA", return_eigenvectors=False, tol=1e-2)[0]
+    P = (P_tentative - (4.0 / 3.0 / spectral_radius) * (D_inv_K @ P_tentative)).tocsr()
+
+    # Galerkin coarse operator, removing coarse DOFs without any fine DOF
+    P = P[:, np.flatnonzero(P_tentative.getnnz(axis=0))]
+    coarse_solver = scipy.sparse.linalg.splu((P.T @ K @ P).tocsc())
+
+    # damped Jacobi smoother, scaled with the spectral radius to stay convergent (and the V-cycle SPD)
+    smoother_diagonal = (smoothing_weight / spectral_radius) * inverse_diagonal
+
+    def smooth(u: npt.NDArray[np.float64], r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        for _ in range(num_smoothing_steps):
+            u = u + smoother_diagonal * (r - K @ u)
+        return u
+
+    def matvec(r: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        r = r.ravel()
+        z = smooth(np.zeros(num_rows), r)
+        z = z + P @ coarse_solver.solve(P.T @ (r - K @ z))
+        return smooth(z, r)
+
+    return scipy.sparse.linalg.LinearOperator(K.shape, matvec=matvec)
+
+
+@sorbet.log.span("create_preconditioner")
+def create_preconditioner(
+    K: scipy.sparse.csr_matrix,
+    preconditioner: str | None = "jacobi",
+    dofs: npt.NDArray[np.int64] | None = None,
+    nodes: npt.NDArray[np.float64] | None = None,
+) -> scipy.sparse.linalg.LinearOperator | None:
+    """Create a preconditioner by name (None, "jacobi", "block_jacobi", "incomplete_cholesky", "amg")"""
+
+    match preconditioner:
+        case None:
+            return None
+        case "jacobi":
+            return jacobi_preconditioner(K)
+        case "block_jacobi":
+            return block_jacobi_preconditioner(K, dofs)
+        case "incomplete_cholesky":
+            return incomplete_cholesky_preconditioner(K)
+        case "amg":
+            return amg_preconditioner(K, dofs, nodes)
+        case _:
+            raise NotImplementedError(f"Currently only supporting None/jacobi/block_jacobi/incomplete_cholesky/amg preconditioners. preconditioner = {preconditioner}")
+
+
+@sorbet.log.span("conjugate_gradient")
+def conjugate_gradient(
+    K: scipy.sparse.csr_matrix | scipy.sparse.linalg.LinearOperator,
+    f: npt.NDArray[np.float64],
+    preconditioner: str | scipy.sparse.linalg.LinearOperator | Callable | None = "jacobi",
+    u0: npt.NDArray[np.float64] | None = None,
+    rtol: float = 1e-8,
+    max_iterations: int = 5000,
+    dofs: npt.NDArray[np.int64] | None = None,
+    nodes: npt.NDArray[np.float64] | None = None,
+    log_every: int = 100,
+) -> tuple[npt.NDArray[np.float64], dict]:
+    """
+    Solve K u = f for symmetric positive definite K with preconditioned conjugate gradients
+
+    `preconditioner` is either a name (see `create_preconditioner`), a LinearOperator, or a callable applied to
+    the residual. `dofs` (global DOF of every row of K) and `nodes` (coordinates, for the rotations in "amg") are
+    passed on to a named preconditioner. `u0` is used as warm start, e.g. the displacement of a previous solve.
+    Convergence is reached when the residual norm is below `rtol * norm(f)`.
+
+    Returns the solution and a dict with "iterations", "residual_norms", and "converged".
+    """
+
+    if isinstance(preconditioner, str):
+        preconditioner = create_preconditioner(K, preconditioner, dofs, nodes)
+    if preconditioner is None:
+        apply_preconditioner = np.copy
+    elif isinstance(preconditioner, scipy.sparse.linalg.LinearOperator):
+        apply_preconditioner = preconditioner.matvec
+    else:
+        apply_preconditioner = preconditioner
+
+    u = np.zeros(f.shape[0]) if u0 is None else np.array(u0, dtype=np.float64)
+    r = f - K @ u
+    residual_norms = [np.linalg.norm(r)]
+    tolerance = rtol * (np.linalg.norm(f) or residual_norms[0])
+
+    z = apply_preconditioner(r)
+    p = z.copy()
+    rz = r @ z
+    iteration = 0
+    while residual_norms[-1] > tolerance and iteration < max_iterations:
+        Kp = K @ p
+        alpha = rz / (p @ Kp)
+        u += alpha * p
+        r -= alpha * Kp
+        residual_norms.append(np.linalg.norm(r))
+        iteration += 1
+        if log_every and iteration % log_every == 0:
+            logging.info(f"CG iteration {iteration}: residual norm = {residual_norms[-1]:.3e}")
+
+        z = apply_preconditioner(r)
+        rz_new = r @ z
+        p = z + (rz_new / rz) * p
+        rz = rz_new
+
+    converged = residual_norms[-1] <= tolerance
+    sorbet.log.count("cg_iterations", iteration)
+    log = logging.info if converged else logging.warning
+    log(f"CG {'converged' if converged else 'did not converge'} after {iteration} iterations: residual norm = {residual_norms[-1]:.3e}")
+    return u, {"iterations": iteration, "residual_norms": np.array(residual_norms), "converged": converged}
+
+
+# factorizations of constrained stiffness matrices, see `FactorizedSolver.from_mesh`
+_factorization_cache = {}
+
+
+def factorization_key(
+    nodes: npt.NDArray[np.float64],
+    elements: npt.NDArray[np.int64],
+    material_parameters: dict,
+    prescribed_dofs: npt.NDArray[np.int64],
+    assembly_options: dict | None = None,
+) -> str:
+    """Hash of everything the constrained stiffness matrix depends on (mesh, material, set of prescribed DOFs, and assembly options)"""
+
+    digest = hashlib.sha256()
+    for array in (nodes, elements, prescribed_dofs):
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype}{array.shape}".encode())
+        digest.update(array.tobytes())
+    for name in sorted(material_parameters):  # scalars or per-element arrays
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(material_parameters[name], dtype=np.float64).tobytes())
+    digest.update(json.dumps(assembly_options or {}, sort_keys=True, default=repr).encode())
+    return digest.hexdigest()
+
+
+def factorization_cache_clear() -> None:
+    """Release all cached factorizations"""
+
+    _factorization_cache.clear()
+
+
+class FactorizedSolver:
+    """
+    Direct solver factorizing the constrained stiffness matrix once and solving many load cases with it
+
+    K is split into the free-free block K_ff, which is factorized (sparse LU with symmetric fill-reducing
+    ordering and no pivoting, i.e. an LDL^T factorization for SPD matrices), and the free-prescribed block K_fp.
+    New prescribed values or forces only change the right-hand side f_f - K_fp u_p, so every load case costs
+    a forward and backward substitution. Several load cases are solved at once as columns of a matrix.
+    """
+
+    @sorbet.log.span("factorization")
+    def __init__(self, K: scipy.sparse.csr_matrix, prescribed_dofs: npt.NDArray[np.int64]):
+        K = scipy.sparse.csr_matrix(K)
+        self.num_dof = K.shape[0]
+        is_prescribed = np.zeros(self.num_dof, dtype=bool)
+        is_prescribed[prescribed_dofs] = True
+        self.free_dofs = np.flatnonzero(~is_prescribed)
+        self.prescribed_dofs = np.asarray(prescribed_dofs, dtype=np.int64)
+
+        K_free = K[self.free_dofs]
+        self.K_fp = K_free[:, self.prescribed_dofs].tocsr()
+        self.factor = scipy.sparse.linalg.splu(
+            K_free[:, self.free_dofs].tocsc(),
+            permc_spec="MMD_AT_PLUS_A",
+            diag_pivot_thresh=0.0,
+            options={"SymmetricMode": True},
+        )
+        sorbet.log.count("factor_nnz", self.factor.L.nnz + self.factor.U.nnz)
+        logging.info(f"Factorized constrained stiffness matrix: {self.free_dofs.shape[0]} DOFs, factor nnz = {self.factor.L.nnz + self.factor.U.nnz}")
+
+    @classmethod
+    def from_mesh(
+        cls,
+        nodes: npt.NDArray[np.float64],
+        elements: npt.NDArray[np.int64],
+        material_parameters: dict,
+        prescribed_dofs: npt.NDArray[np.int64],
+        use_cache: bool = True,
+        **assembly_options,
+    ) -> "FactorizedSolver":
+        """
+        Solver for the given mesh, material, and set of prescribed DOFs
+
+        The factorization is looked up in an in-memory cache first (see `factorization_key`), so that neither
+        assembly nor factorization is repeated on a hit. `assembly_options` are passed to
+        `sorbet.fem.assemble_global_stiffness_matrix`.
+        """
+
+        key = factorization_key(nodes, elements, material_parameters, prescribed_dofs, assembly_options)
+        if use_cache and key in _factorization_cache:
+            logging.info(f"Reusing cached factorization {key}")
+            sorbet.log.count("factorization_cache_hits")
+            return _factorization_cache[key]
+
+        K = sorbet.fem.assemble_global_stiffness_matrix(nodes, elements, material_parameters, **assembly_options)
+        solver = cls(K, prescribed_dofs)
+        if use_cache:
+            _factorization_cache[key] = solver
+        return solver
+
+    def solve(self, f: npt.NDArray[np.float64], prescribed_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """
+        Displacements of all DOFs for forces `f` and `prescribed_values` (ordered as `prescribed_dofs`)
+
+        Pass `f` with shape (num_dof, num_cases) and `prescribed_values` with shape (num_prescribed, num_cases)
+        to solve several load cases at once, either of them may also be given for a single case and is then
+        used for all cases.
+        """
+
+        f = np.asarray(f, dtype=np.float64)
+        prescribed_values = np.asarray(prescribed_values, dtype=np.float64)
+        if f.ndim == 2 or prescribed_values.ndim == 2:
+            num_cases = f.shape[1] if f.ndim == 2 else prescribed_values.shape[1]
+            f = np.broadcast_to(f.reshape(self.num_dof, -1), (self.num_dof, num_cases))
+            prescribed_values = np.broadcast_to(prescribed_values.reshape(-1, 1) if prescribed_values.ndim < 2 else prescribed_values, (self.prescribed_dofs.shape[0], num_cases))
+        else:
+            prescribed_values = np.broadcast_to(prescribed_values, self.prescribed_dofs.shape)
+
+        rhs = f[self.free_dofs] - self.K_fp @ prescribed_values
+        sorbet.log.count("direct_solves", 1 if rhs.ndim == 1 else rhs.shape[1])
+        u = np.zeros((self.num_dof,) + rhs.shape[1:])
+        u[self.free_dofs] = self.factor.solve(np.ascontiguousarray(rhs))
+        u[self.prescribed_dofs] = prescribed_values
+        return u
@@ -1,29 +1,159 @@
 """Utilities regarding sparsity of the global system of equations"""
 
-import matplotlib.pyplot as plt
+import functools
+import logging
+
 import numpy as np
 import numpy.typing as npt
+import scipy.sparse
 
 
-def plot_sparsity_pattern(nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64]) -> None:
-    """Plot sparsity pattern of global stiffness matrix"""
+class SparsityPattern:
+    """
+    Symbolic structure of the global stiffness matrix, computed from the element connectivity only
+
+    Every pair of nodes sharing an element gives a nonzero block of size num_dof_per_node x num_dof_per_node.
+    The pattern is stored in CSR format on node level and on DOF level and can be reused for assembly
+    (see `scatter_positions`), reordering, and analysis without ever creating a matrix of size num_dof x num_dof.
+    """
+
+    def __init__(self, elements: npt.NDArray[np.int64], num_nodes: int, num_dof_per_node: int = 3):
+        self.elements = elements
+        self.num_nodes = num_nodes
+        self.num_dof_per_node = num_dof_per_node
+        self.num_dof = num_dof_per_node * num_nodes
+
+        # node graph: unique node pairs, sorted by row and column
+        node_keys = (elements[:, :, None] * num_nodes + elements[:, None, :]).ravel()
+        unique_node_keys, self._element_node_positions = np.unique(node_keys, return_inverse=True)
+        self.node_rows = unique_node_keys // num_nodes
+        self.node_indices = unique_node_keys % num_nodes
+        self.node_indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.node_rows, minlength=num_nodes), out=self.node_indptr[1:])
+
+        # expand node blocks to DOFs: row (d * i + c) holds columns (d * j + e) for all neighbors j of node i
+        d = num_dof_per_node
+        c = np.arange(d)
+        num_neighbors = np.diff(self.node_indptr)
+        self.indptr = np.zeros(self.num_dof + 1, dtype=np.int64)
+        self.indptr[:-1] = (d * d * self.node_indptr[:-1, None] + d * c * num_neighbors[:, None]).ravel()
+        self.indptr[-1] = d * d * self.node_indptr[-1]
+        block_offsets = np.arange(unique_node_keys.shape[0]) - self.node_indptr[self.node_rows]
+        self.indices = np.empty(d * d * unique_node_keys.shape[0], dtype=np.int64)
+        for i in range(d):
+            for e in range(d):
+                self.indices[self.indptr[d * self.node_rows + i] + d * block_offsets + e] = d * self.node_indices + e
+
+    @property
+    def nnz(self) -> int:
+        return self.indices.shape[0]
+
+    @functools.cached_property
+    def scatter_positions(self) -> npt.NDArray[np.int64]:
+        """
+        Position in the CSR data array for every entry of every element matrix
+
+        `scatter_positions[e, i, j]` is the index to which entry `K_e[i, j]` of element `e` has to be added.
+        """
+
+        d = self.num_dof_per_node
+        c = np.arange(d)
+        num_elements, num_nodes_per_element = self.elements.shape
+        node_positions = self._element_node_positions.reshape(num_elements, num_nodes_per_element, 1, num_nodes_per_element, 1)
+        row_nodes = self.elements[:, :, None, None, None]
+        i = c[None, None, :, None, None]
+        e = c[None, None, None, None, :]
+        positions = self.indptr[d * row_nodes + i] + d * (node_positions - self.node_indptr[row_nodes]) + e
+        return positions.reshape(num_elements, d * num_nodes_per_element, d * num_nodes_per_element)
+
+    def to_csr(self, data: npt.NDArray[np.float64] | None = None) -> scipy.sparse.csr_matrix:
+        """Sparse matrix with this pattern, filled with `data` (ones by default)"""
+
+        if data is None:
+            data = np.ones(self.nnz)
+        return scipy.sparse.csr_matrix((data, self.indices, self.indptr), shape=(self.num_dof, self.num_dof))
+
+    def row_extents(self) -> npt.NDArray[np.int64]:
+        """Distance of the diagonal to the first nonzero in every row"""
+
+        first_columns = self.indices[self.indptr[:-1]]  # columns are sorted within each row
+        return np.maximum(np.arange(self.num_dof) - first_columns, 0)
+
+    def bandwidth(self) -> int:
+        """Maximum distance of any nonzero to the diagonal"""
 
-    num_nodes = nodes.shape[0]
-    num_space_dims = nodes.shape[1]
+        node_bandwidth = np.abs(self.node_rows - self.node_indices).max()
+        return int(self.num_dof_per_node * node_bandwidth + self.num_dof_per_node - 1)
+
+    def profile(self) -> int:
+        """Number of entries in the lower envelope (excluding the diagonal)"""
+
+        return int(self.row_extents().sum())
+
+    def estimated_factor_nnz(self) -> int:
+        """
+        Estimated number of nonzeros of the Cholesky factor
+
+        Fill-in of a Cholesky factorization is confined to the envelope, so the envelope size (profile plus diagonal)
+        is an upper bound for the factor without further reordering inside the solver.
+        """
+
+        return self.profile() + self.num_dof
+
+    def factor_nnz(self) -> int:
+        """
+        Exact number of nonzeros of the Cholesky factor in the current ordering (symbolic, ignoring cancellation)
+
+        A diagonally dominant matrix with the node graph as pattern is factorized without reordering and pivoting,
+        and the node-level factor is expanded to DOFs. This factorizes a matrix of size num_nodes, so it may be
+        expensive for meshes with a poor ordering.
+        """
+
+        import scipy.sparse.linalg
+
+        node_graph = scipy.sparse.csr_matrix(
+            (np.where(self.node_rows == self.node_indices, 2.0 * np.diff(self.node_indptr)[self.node_rows], -1.0), self.node_indices, self.node_indptr),
+            shape=(self.num_nodes, self.num_nodes),
+        )
+        lu = scipy.sparse.linalg.splu(node_graph.tocsc(), permc_spec="NATURAL", diag_pivot_thresh=0.0, options={"SymmetricMode": True})
+        d = self.num_dof_per_node
+        return int(d * (d + 1) // 2 * self.num_nodes + d * d * (lu.L.nnz - self.num_nodes))
+
+    def report(self, exact_factor_nnz: bool = False) -> dict:
+        """Summary of the pattern, also written to the log (see `factor_nnz` for the cost of `exact_factor_nnz=True`)"""
+
+        factor_nnz = self.factor_nnz() if exact_factor_nnz else self.estimated_factor_nnz()
+        summary = {
+            "num_dof": self.num_dof,
+            "nnz": self.nnz,
+            "density": self.nnz / self.num_dof**2,
+            "bandwidth": self.bandwidth(),
+            "profile": self.profile(),
+            "factor_nnz": factor_nnz,
+            "factor_nnz_is_exact": exact_factor_nnz,
+            "fill_ratio": factor_nnz / (0.5 * (self.nnz + self.num_dof)),
+            "factor_memory_bytes": 8 * factor_nnz + 8 * self.num_dof,
+            "matrix_memory_bytes": 8 * self.nnz + 8 * self.nnz + 8 * (self.num_dof + 1),
+        }
+        logging.info(
+            f"Sparsity pattern: {summary['num_dof']} DOFs, nnz = {summary['nnz']}, bandwidth = {summary['bandwidth']}, "
+            f"profile = {summary['profile']}, factor nnz = {summary['factor_nnz']} ({'exact' if exact_factor_nnz else 'envelope estimate'}), "
+            f"factor memory = {summary['factor_memory_bytes'] / 2**20:.1f} MiB"
+        )
+        return summary
+
+
+def plot_sparsity_pattern(nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64], sparsity_pattern: SparsityPattern | None = None) -> None:
+    """Plot sparsity pattern of global stiffness matrix"""
 
-    num_dof_per_node = num_space_dims
-    num_dof = num_nodes * num_dof_per_node
+    import matplotlib.pyplot as plt  # deferred, importing Matplotlib is expensive and only needed for plotting
 
-    k = np.zeros((num_dof, num_dof))
-    for element in elements:
-        for i in element:
-            i_start = i * 3
-            i_end = i_start + 3
-            for j in element:
-                j_start = j * 3
-                j_end = j_start + 3
-                k[i_start:i_end, j_start:j_end] += 1.0
+    if sparsity_pattern is None:
+        num_nodes = nodes.shape[0]
+        num_space_dims = nodes.shape[1]
+        num_dof_per_node = num_space_dims
+        sparsity_pattern = SparsityPattern(elements, num_nodes, num_dof_per_node)
 
-    plt.spy(k, markersize=1)
+    plt.spy(sparsity_pattern.to_csr(), markersize=1)
     plt.title("Sparsity pattern of the global stiffness matrix")
     plt.show()
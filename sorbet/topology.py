@@ -0,0 +1,223 @@
+"""Mesh topology (boundary faces) and spatial index for node queries and point probes"""
+
+import functools
+
+import numpy as np
+import numpy.typing as npt
+
+import sorbet
+
+# local node indices of the six faces of a hexahedron in Gmsh's node ordering, oriented outwards
+HEXAHEDRON_FACES = np.array(
+    [
+        [0, 3, 2, 1],  # zeta = -1
+        [4, 5, 6, 7],  # zeta = +1
+        [0, 1, 5, 4],  # eta = -1
+        [2, 3, 7, 6],  # eta = +1
+        [0, 4, 7, 3],  # xi = -1
+        [1, 2, 6, 5],  # xi = +1
+    ]
+)
+
+
+def boundary_faces(elements: npt.NDArray[np.int64]) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """
+    Faces belonging to exactly one element
+
+    Returns `(faces, face_elements)`, the four nodes of every boundary face (oriented outwards) and the element it belongs to.
+    """
+
+    faces = elements[:, HEXAHEDRON_FACES].reshape(-1, 4)
+    _, first_occurrence, counts = np.unique(np.sort(faces, axis=1), axis=0, return_index=True, return_counts=True)
+    boundary = np.sort(first_occurrence[counts == 1])
+    return faces[boundary], boundary // HEXAHEDRON_FACES.shape[0]
+
+
+class MeshIndex:
+    """
+    Spatial index of a mesh, built once and queried many times
+
+    Node queries (boxes and planes) use the nodes sorted along every axis, so that a query costs a binary search
+    plus the number of candidates along the most selective axis instead of a full scan. Points are located in
+    elements with a uniform grid over the element bounding boxes and a batched inverse isoparametric map.
+    """
+
+    def __init__(self, nodes: npt.NDArray[np.float64], elements: npt.NDArray[np.int64]):
+        self.nodes = nodes
+        self.elements = elements
+        self.lower = nodes.min(axis=0)
+        self.upper = nodes.max(axis=0)
+        self.tolerance = 1e-8 * np.linalg.norm(self.upper - self.lower)
+        self.axis_order = np.argsort(nodes, axis=0, kind="stable")  # (num_nodes, 3)
+        self.sorted_coordinates = np.take_along_axis(nodes, self.axis_order, axis=0)
+
+    @functools.cached_property
+    def boundary(self) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """Boundary faces and the elements they belong to, see `boundary_faces`"""
+
+        return boundary_faces(self.elements)
+
+    @functools.cached_property
+    def boundary_nodes(self) -> npt.NDArray[np.int64]:
+        return np.unique(self.boundary[0])
+
+    @functools.cached_property
+    def element_boxes(self) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.float64]]:
+        """Axis-aligned bounding boxes of the elements, widened by `tolerance`, as `(lower, upper)` of shape (num_elements, 3)"""
+
+        X = self.nodes[self.elements]
+        return X.min(axis=1) - self.tolerance, X.max(axis=1) + self.tolerance
+
+    @functools.cached_property
+    def element_grid(self) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.int64], npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+        """
+        Uniform grid over the mesh with the elements whose bounding box overlaps each cell
+
+        The cells are about as large as the mean element bounding box, so that every cell holds a few elements.
+        Returns `(cell_size, grid_shape, offsets, cell_elements)`, where the elements of cell c (in C order) are
+        `cell_elements[offsets[c]:offsets[c + 1]]`.
+        """
+
+        box_lower, box_upper = self.element_boxes
+        extent = self.upper - self.lower
+        cell_size = np.maximum((box_upper - box_lower).mean(axis=0), 1e-3 * extent.max())
+        grid_shape = np.clip(np.ceil(extent / cell_size).astype(np.int64), 1, None)
+        first = np.clip(((box_lower - self.lower) // cell_size).astype(np.int64), 0, grid_shape - 1)
+        last = np.clip(((box_upper - self.lower) // cell_size).astype(np.int64), 0, grid_shape - 1)
+
+        # all cells of every element's range of cells
+        range_shape = last - first + 1
+        counts = range_shape.prod(axis=1)
+        element_ids = np.repeat(np.arange(self.elements.shape[0]), counts)
+        position = np.arange(element_ids.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+        offsets_in_range = np.empty((element_ids.shape[0], 3), dtype=np.int64)
+        for axis in (2, 1, 0):
+            offsets_in_range[:, axis] = position % range_shape[element_ids, axis]
+            position //= range_shape[element_ids, axis]
+        cells = np.ravel_multi_index((first[element_ids] + offsets_in_range).T, grid_shape)
+
+        order = np.argsort(cells, kind="stable")
+        offsets = np.zeros(grid_shape.prod() + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(cells, minlength=grid_shape.prod()))
+        return cell_size, grid_shape, offsets, element_ids[order]
+
+    def nodes_in_box(
+        self,
+        lower: npt.ArrayLike,
+        upper: npt.ArrayLike,
+        tolerance: float | None = None,
+        boundary_only: bool = False,
+    ) -> npt.NDArray[np.int64]:
+        """Sorted indices of all nodes within the axis-aligned box [lower, upper], widened by `tolerance`"""
+
+        if tolerance is None:
+            tolerance = self.tolerance
+        lower = np.broadcast_to(np.asarray(lower, dtype=np.float64), (3,)) - tolerance
+        upper = np.broadcast_to(np.asarray(upper, dtype=np.float64), (3,)) + tolerance
+
+        # candidates from the most selective axis, filtered by the remaining ones
+        starts = [np.searchsorted(self.sorted_coordinates[:, axis], lower[axis], side="left") for axis in range(3)]
+        stops = [np.searchsorted(self.sorted_coordinates[:, axis], upper[axis], side="right") for axis in range(3)]
+        axis = np.argmin(np.subtract(stops, starts))
+        candidates = self.axis_order[starts[axis] : stops[axis], axis]
+        coordinates = self.nodes[candidates]
+        inside = np.all((coordinates >= lower) & (coordinates <= upper), axis=1)
+        selected = np.sort(candidates[inside])
+        if boundary_only:
+            selected = np.intersect1d(selected, self.boundary_nodes, assume_unique=True)
+        return selected
+
+    def nodes_on_plane(self, axis: int, value: float, tolerance: float | None = None) -> npt.NDArray[np.int64]:
+        """Sorted indices of all nodes with coordinate `value` along `axis` (0, 1, 2 for x, y, z)"""
+
+        lower, upper = self.lower.copy(), self.upper.copy()
+        lower[axis] = upper[axis] = value
+        return self.nodes_in_box(lower, upper, tolerance)
+
+    def locate_points(
+        self,
+        points: npt.NDArray[np.float64],
+        tolerance: float = 1e-8,
+        max_iterations: int = 20,
+    ) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        """
+        Find the element containing every point and the point's reference coordinates in it
+
+        Every element whose bounding box contains the point is a candidate, found through the grid cell of the point
+        (see `element_grid`). The candidates are tried in turn for all unresolved points at once: the isoparametric
+        map x(xi) = N(xi)^T X is inverted with Newton's method, and the point is inside if the reference coordinates
+        lie in [-1, 1]^3 (up to `tolerance`).
+        Returns `(element_ids, reference_coordinates)`, where points outside of the mesh get element -1 and NaN coordinates.
+        """
+
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        num_points = points.shape[0]
+        element_ids = np.full(num_points, -1, dtype=np.int64)
+        reference_coordinates = np.full((num_points, 3), np.nan)
+
+        # candidate pairs (point, element) from the grid cell of every point within the mesh's bounding box
+        cell_size, grid_shape, offsets, cell_elements = self.element_grid
+        in_grid = np.flatnonzero(np.all((points >= self.lower - self.tolerance) & (points <= self.upper + self.tolerance), axis=1))
+        cell_indices = np.clip(((points[in_grid] - self.lower) // cell_size).astype(np.int64), 0, grid_shape - 1)
+        cells = np.ravel_multi_index(cell_indices.T, grid_shape)
+        counts = offsets[cells + 1] - offsets[cells]
+        point_ids = np.repeat(in_grid, counts)
+        candidates = cell_elements[np.repeat(offsets[cells] - np.cumsum(counts) + counts, counts) + np.arange(point_ids.shape[0])]
+        box_lower, box_upper = self.element_boxes
+        in_box = np.all((points[point_ids] >= box_lower[candidates]) & (points[point_ids] <= box_upper[candidates]), axis=1)
+        point_ids, candidates = point_ids[in_box], candidates[in_box]
+
+        # the k-th candidate of all points still unresolved at once, points on shared faces are in several elements
+        counts = np.bincount(point_ids, minlength=num_points)
+        ranks = np.arange(point_ids.shape[0]) - np.repeat(np.cumsum(counts) - counts, counts)
+        for k in range(counts.max(initial=0)):
+            pairs = np.flatnonzero(ranks == k)
+            pairs = pairs[element_ids[point_ids[pairs]] < 0]
+            if pairs.shape[0] == 0:
+                continue
+            xi, converged = self.inverse_isoparametric_map(points[point_ids[pairs]], candidates[pairs], tolerance, max_iterations)
+            inside = converged & np.all(np.abs(xi) <= 1.0 + tolerance, axis=1)
+            element_ids[point_ids[pairs[inside]]] = candidates[pairs[inside]]
+            reference_coordinates[point_ids[pairs[inside]]] = xi[inside]
+        return element_ids, reference_coordinates
+
+    def inverse_isoparametric_map(
+        self,
+        points: npt.NDArray[np.float64],
+        element_ids: npt.NDArray[np.int64],
+        tolerance: float = 1e-8,
+        max_iterations: int = 20,
+    ) -> tuple[npt.NDArray[np.float64], npt.NDArray[np.bool_]]:
+        """Reference coordinates of `points[i]` in element `element_ids[i]` (Newton's method) and whether it converged"""
+
+        X = self.nodes[self.elements[element_ids]]  # (num_points, 8, 3)
+        X_T = np.swapaxes(X, 1, 2)
+        xi = np.zeros(points.shape)
+        converged = np.zeros(points.shape[0], dtype=bool)
+        for _ in range(max_iterations):
+            active = ~converged
+            if not np.any(active):
+                break
+            N = sorbet.fem.linear_shape_functions_batched(xi[active])
+            dN = sorbet.fem.linear_shape_function_derivatives_batched(xi[active])
+            residual = (X_T[active] @ N[..., None])[..., 0] - points[active]
+            J = X_T[active] @ dN
+            J[np.abs(np.linalg.det(J)) < 1e-300] = np.eye(3)  # degenerate map far outside of a distorted element
+            step = np.linalg.solve(J, residual[..., None])[..., 0]
+            xi[active] = np.clip(xi[active] - step, -4.0, 4.0)  # points far outside of the element cannot be inside
+            converged[active] = np.linalg.norm(step, axis=1) < tolerance
+        return xi, converged
+
+    def probe(self, points: npt.NDArray[np.float64], nodal_values: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+        """
+        Interpolate nodal values (one row per node, e.g. displacements) at arbitrary points
+
+        Returns one row per point, NaN for points outside of the mesh.
+        """
+
+        element_ids, xi = self.locate_points(points)
+        inside = element_ids >= 0
+        values = np.full((xi.shape[0],) + nodal_values.shape[1:], np.nan)
+        N = sorbet.fem.linear_shape_functions_batched(xi[inside])  # (num_inside, 8)
+        values[inside] = np.einsum("pa,pa...->p...", N, nodal_values[self.elements[element_ids[inside]]])
+        return values